@@ -1,19 +1,62 @@
-from flask import Flask, render_template, request, redirect, url_for, send_file, flash, make_response
+from flask import Flask, render_template, request, redirect, url_for, send_file, flash, make_response, jsonify, Response, stream_with_context, g, has_request_context, session
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-import pandas as pd
 import os
-from io import BytesIO
-import openpyxl
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from datetime import datetime
+from io import BytesIO, StringIO, TextIOWrapper
+import csv
+import gzip
+import hashlib
+import importlib
+import importlib.util
+import json
+import multiprocessing
+import sqlite3
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, partial
+from datetime import datetime, timedelta, timezone
+from collections import Counter, OrderedDict, namedtuple
+from types import MappingProxyType
 import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager, nullcontext
 from dotenv import load_dotenv
-from supabase import create_client, Client
+import click
+from werkzeug.http import is_resource_modified
 from werkzeug.security import generate_password_hash, check_password_hash
 
+try:
+    import fcntl
+except ImportError:  # Not on Windows; the record mirror then only locks within a process
+    fcntl = None
+
+class LazyModule:
+    """
+    Stands in for a module and imports it on first attribute access. Every cold start
+    used to import pandas, numpy and friends up front, including for routes such as
+    /login that never touch them; now only the first request that needs one pays for it.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+# Optional: without pyarrow the local record mirror stays off
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+pa = LazyModule('pyarrow')
+pc = LazyModule('pyarrow.compute')
+pq = LazyModule('pyarrow.parquet')
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,316 +64,3071 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask
-app = Flask(__name__, template_folder='templates', static_folder='static')
-app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'supersecretkey')
+# Initialize Flask
+app = Flask(__name__, template_folder='templates', static_folder='static')
+app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'supersecretkey')
+
+# Initialize Flask-Login
+login_manager = LoginManager()
+login_manager.init_app(app)
+login_manager.login_view = 'login'
+
+# Instrumentation
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+def log_event(event, level=logging.INFO, **fields):
+    """
+    Emits one structured (JSON) log line: {"event": ..., **fields}.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps({'event': event, **fields}, default=str))
+
+class Metrics:
+    """
+    Process-level counters and fixed-bucket latency histograms (milliseconds).
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._histograms = {}
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name, ms):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = {'counts': [0] * (len(self.buckets) + 1), 'count': 0, 'sum_ms': 0.0}
+            histogram['counts'][next((i for i, bound in enumerate(self.buckets) if ms <= bound), len(self.buckets))] += 1
+            histogram['count'] += 1
+            histogram['sum_ms'] += ms
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'histograms': {
+                    name: {
+                        'buckets_ms': {str(bound): count for bound, count in zip(self.buckets + ['+Inf'], h['counts'])},
+                        'count': h['count'],
+                        'sum_ms': round(h['sum_ms'], 3),
+                    }
+                    for name, h in self._histograms.items()
+                },
+            }
+
+metrics = Metrics(HISTOGRAM_BUCKETS_MS)
+
+class _Timer:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        ms = (time.perf_counter() - self.started) * 1000
+        metrics.observe(f'stage.{self.stage}', ms)
+        if has_request_context():
+            g.setdefault('timings', []).append((self.stage, ms))
+        elif getattr(_worker_timings, 'stages', None) is not None:
+            _worker_timings.stages.append((self.stage, ms))
+        return False
+
+# Stages timed on database pool threads are collected here and merged into the
+# request's timings by run_concurrently
+_worker_timings = threading.local()
+
+_NO_TIMER = nullcontext()
+
+def timed(stage):
+    """
+    Context manager timing one stage of the current request. The duration goes into
+    the stage histogram and the request's Server-Timing header. A shared no-op when
+    METRICS_ENABLED is off.
+    """
+    return _Timer(stage) if METRICS_ENABLED else _NO_TIMER
+
+class _TimedQuery:
+    """
+    Wraps a postgrest query builder so that execute() is timed as a 'db.<table>.<action>' stage.
+    """
+
+    _ACTIONS = ('select', 'insert', 'upsert', 'update', 'delete')
+
+    def __init__(self, query, label):
+        self._query = query
+        self._label = label
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+        label = f'{self._label}.{name}' if name in self._ACTIONS else self._label
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return _TimedQuery(result, label) if hasattr(result, 'execute') else result
+        return chained
+
+    def execute(self):
+        metrics.increment(f'{self._label}.calls')
+        with timed(self._label):
+            return self._query.execute()
+
+class TimedSupabase:
+    """
+    Thin proxy over the Supabase client that times every table() and rpc() round trip.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def table(self, name):
+        return _TimedQuery(self.client.table(name), f'db.{name}')
+
+    def rpc(self, name, params=None):
+        return _TimedQuery(self.client.rpc(name, params or {}), f'db.rpc.{name}')
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+class APIError(Exception):
+    """
+    Placeholder for postgrest's APIError until a Supabase client is installed.
+    set_supabase_client rebinds the name to the real class, and no query can run
+    (or raise) before that, so the except clauses below always see the real one.
+    """
+
+def set_supabase_client(client):
+    """
+    Installs the Supabase client (or a local stand-in) used by every query in this module.
+    """
+    global supabase, APIError
+    from postgrest.exceptions import APIError
+
+    supabase = TimedSupabase(client) if METRICS_ENABLED else client
+
+class LazySupabase:
+    """
+    Placeholder for the Supabase client until the first query. Creating the client
+    imports supabase-py with httpx and postgrest, which a cold start serving /login
+    does not need. The first table(), rpc() or attribute access connects and installs
+    the real client in this module, where it stays (with its keep-alive pool) for the
+    life of the process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def _client(self):
+        with self._lock:
+            if supabase is self:
+                connect_supabase()
+        return supabase
+
+    def table(self, name):
+        return self._client().table(name)
+
+    def rpc(self, name, params=None):
+        return self._client().rpc(name, params)
+
+    def __getattr__(self, name):
+        return getattr(self._client(), name)
+
+supabase = LazySupabase()
+
+@app.before_request
+def start_request_timer():
+    if METRICS_ENABLED:
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    if not METRICS_ENABLED or 'request_started' not in g:
+        return response
+    total_ms = (time.perf_counter() - g.request_started) * 1000
+    endpoint = request.endpoint or 'unknown'
+    metrics.increment(f'requests.{endpoint}.{response.status_code}')
+    metrics.observe(f'request.{endpoint}', total_ms)
+
+    durations = OrderedDict()
+    for stage, ms in g.get('timings', []):
+        durations[stage] = durations.get(stage, 0.0) + ms
+    entries = [f'{stage};dur={ms:.1f}' for stage, ms in durations.items()]
+    entries.append(f'total;dur={total_ms:.1f}')
+    # Stage timings reveal internals, so like /metrics they are only shown to admins
+    if current_user.is_authenticated and current_user.role == 'admin':
+        response.headers['Server-Timing'] = ', '.join(entries)
+    log_event('request', endpoint=endpoint, method=request.method, status=response.status_code,
+              duration_ms=round(total_ms, 1), stages={stage: round(ms, 1) for stage, ms in durations.items()})
+    return response
+
+# Initialize Supabase client
+SUPABASE_URL = os.environ.get('SUPABASE_URL')
+SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
+if not SUPABASE_URL or not SUPABASE_KEY:
+    log_event('supabase_config_missing', level=logging.ERROR)
+    raise ValueError("SUPABASE_URL or SUPABASE_KEY environment variable is not set.")
+# Concurrent database access: independent queries of a request run on a small thread
+# pool, over one keep-alive HTTP/2 session shared by all threads
+DB_WORKERS = int(os.environ.get('DB_WORKERS', 4))
+DB_KEEPALIVE_SECONDS = float(os.environ.get('DB_KEEPALIVE_SECONDS', 60))
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='supabase') if DB_WORKERS > 1 else None
+
+def configure_http_pool(client):
+    """
+    Replaces the REST session of a Supabase client with one that keeps idle connections
+    for DB_KEEPALIVE_SECONDS (httpx drops them after 5s by default), so requests that
+    arrive a little apart still skip the TCP and TLS handshakes. Other clients are left alone.
+    """
+    import httpx
+    from postgrest.utils import SyncClient
+
+    postgrest = getattr(client, 'postgrest', None)
+    session = getattr(postgrest, 'session', None)
+    if not isinstance(session, httpx.Client):
+        return
+    postgrest.session = SyncClient(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        follow_redirects=True,
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=max(DB_WORKERS * 2, 10),
+            max_keepalive_connections=max(DB_WORKERS, 1),
+            keepalive_expiry=DB_KEEPALIVE_SECONDS,
+        ),
+    )
+    session.close()
+
+def _collect_timings(call):
+    _worker_timings.stages = []
+    try:
+        return call(), _worker_timings.stages
+    finally:
+        _worker_timings.stages = None
+
+def db_submit(call):
+    """
+    Starts call() on the database pool and returns its Future; runs it inline
+    (returning a completed Future) when the pool is disabled.
+    """
+    if db_executor is not None:
+        return db_executor.submit(call)
+    future = Future()
+    try:
+        future.set_result(call())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def run_concurrently(*calls):
+    """
+    Runs independent zero-argument callables on the database pool and returns their
+    results in order, re-raising the first failure. Their timed stages are added to
+    the current request's Server-Timing.
+    """
+    if db_executor is None or len(calls) < 2:
+        return [call() for call in calls]
+    futures = [db_executor.submit(_collect_timings, call) for call in calls]
+    results = []
+    for future in futures:
+        result, stages = future.result()
+        if has_request_context():
+            g.setdefault('timings', []).extend(stages)
+        results.append(result)
+    return results
+
+def connect_supabase():
+    """
+    Creates the Supabase client and installs it; called on the first query.
+    """
+    try:
+        from supabase import create_client
+
+        client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        configure_http_pool(client)
+        set_supabase_client(client)
+        log_event('supabase_connected', url=SUPABASE_URL)
+    except Exception as e:
+        log_event('supabase_connect_failed', level=logging.ERROR, error=str(e))
+        raise RuntimeError(f"Failed to initialize Supabase client: {str(e)}")
+
+# User model for Flask-Login
+class User(UserMixin):
+    def __init__(self, id, username, role):
+        self.id = id
+        self.username = username
+        self.role = role
+
+class UserCache:
+    """
+    Small TTL cache of User objects keyed by id, so authenticated requests
+    do not need a Supabase round trip just to restore the session user.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._users = {}
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(str(user_id))
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def put(self, user):
+        with self._lock:
+            self._users[str(user.id)] = (time.monotonic(), user)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(str(user_id), None)
+
+    def info(self):
+        with self._lock:
+            return {**self.stats, 'users': len(self._users), 'ttl_seconds': self.ttl}
+
+user_cache = UserCache(ttl=float(os.environ.get('USER_CACHE_TTL', 60)))
+
+@login_manager.user_loader
+def load_user(user_id):
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    try:
+        response = supabase.table('users').select('id, username, role').eq('id', user_id).execute()
+        if response.data:
+            user_data = response.data[0]
+            user = User(user_data['id'], user_data['username'], user_data['role'])
+            user_cache.put(user)
+            return user
+        return None
+    except Exception as e:
+        log_event('load_user_failed', level=logging.ERROR, user_id=user_id, error=str(e))
+        return None
+
+# Built-in fleet. It seeds the units table (see supabase/migrations) and is what the unit
+# registry serves while that table does not exist yet.
+DEFAULT_UNIT_ROWS = [
+    {"NO_UNIT": "DZ3007", "penjatahan": 52, "max_capacity": 1000, "initial_hm_awal": 45645},
+    {"NO_UNIT": "DZ3014", "penjatahan": 52, "max_capacity": 1000, "initial_hm_awal": 46203},
+    {"NO_UNIT": "DZ3026", "penjatahan": 52, "max_capacity": 1200, "initial_hm_awal": 20629},
+    {"NO_UNIT": "EX1022", "penjatahan": 58, "max_capacity": 980, "initial_hm_awal": 34750},
+    {"NO_UNIT": "EX2017", "penjatahan": 93, "max_capacity": 1380, "initial_hm_awal": 46115},
+    {"NO_UNIT": "EX2027", "penjatahan": 93, "max_capacity": 1380, "initial_hm_awal": 35466},
+    {"NO_UNIT": "EX2032", "penjatahan": 93, "max_capacity": 1380, "initial_hm_awal": 27140},
+    {"NO_UNIT": "EX2033", "penjatahan": 93, "max_capacity": 1380, "initial_hm_awal": 26280},
+    {"NO_UNIT": "EX2040", "penjatahan": 93, "max_capacity": 1380, "initial_hm_awal": 19070},
+    {"NO_UNIT": "EX3009", "penjatahan": 126, "max_capacity": 3400, "initial_hm_awal": 36002},
+]
+UNITS_CHECK_INTERVAL = float(os.environ.get('UNITS_CHECK_INTERVAL', 30))
+
+UnitSnapshot = namedtuple('UnitSnapshot', ['version', 'units', 'penjatahan', 'max_capacity', 'initial_hm_awal'])
+
+def build_unit_snapshot(version, rows):
+    """
+    Builds an immutable UnitSnapshot from units rows. The lookups cover every unit, so
+    records of deactivated units still resolve, while units lists only the active ones.
+    """
+    rows = sorted(rows, key=lambda row: row['NO_UNIT'])
+    return UnitSnapshot(
+        version=version,
+        units=tuple(row['NO_UNIT'] for row in rows if row.get('active', True)),
+        penjatahan=MappingProxyType({row['NO_UNIT']: int(row['penjatahan']) for row in rows}),
+        max_capacity=MappingProxyType({row['NO_UNIT']: float(row['max_capacity']) for row in rows}),
+        initial_hm_awal=MappingProxyType({row['NO_UNIT']: float(row.get('initial_hm_awal') or 0.0) for row in rows}),
+    )
+
+class UnitRegistry:
+    """
+    Process-level registry of fleet units, loaded from the units table into an immutable
+    UnitSnapshot. Readers get the current snapshot without a query; at most once every
+    check_interval seconds a single count/newest-updated_at query decides whether the
+    table changed and a reload is needed. Admin edits in this process reload immediately.
+    """
+
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is None:
+                self._load(now)
+            elif now - self._checked_at >= self.check_interval:
+                self._check(now)
+            return self._snapshot
+
+    def reload(self):
+        """
+        Reloads the snapshot now (after an edit in this process); errors are raised.
+        """
+        with self._lock:
+            self._load(time.monotonic(), raise_errors=True)
+            return self._snapshot
+
+    def info(self):
+        snapshot = self._snapshot
+        return {
+            **self.stats,
+            'version': snapshot.version if snapshot else None,
+            'units': len(snapshot.penjatahan) if snapshot else 0,
+            'active_units': len(snapshot.units) if snapshot else 0,
+            'check_interval_seconds': self.check_interval,
+        }
+
+    def _fetch_version(self):
+        response = (
+            supabase.table('units').select('updated_at', count='exact')
+            .order('updated_at', desc=True).limit(1).execute()
+        )
+        newest = response.data[0]['updated_at'] if response.data else None
+        return f"{response.count or 0}@{newest}"
+
+    def _fetch_rows(self):
+        rows = []
+        while True:
+            batch = (
+                supabase.table('units').select('*').order('NO_UNIT')
+                .range(len(rows), len(rows) + SUPABASE_PAGE_SIZE - 1).execute().data or []
+            )
+            rows.extend(batch)
+            if len(batch) < SUPABASE_PAGE_SIZE:
+                return rows
+
+    def _load(self, now, raise_errors=False):
+        self.stats['loads'] += 1
+        try:
+            # Version first: rows read after it are never older than it, so a change landing
+            # in between leaves a stale version that the next check reloads
+            version = self._fetch_version()
+            rows = self._fetch_rows()
+        except Exception as e:
+            if isinstance(e, APIError) and e.code in MISSING_TABLE_CODES:
+                log_event('units_table_missing', level=logging.WARNING, error=e.message)
+            else:
+                log_event('units_load_failed', level=logging.ERROR, error=str(e))
+                if raise_errors:
+                    raise
+                if self._snapshot is not None:
+                    # Keep serving the current snapshot; the next check retries
+                    self._checked_at = now
+                    return
+            version, rows = 'builtin', DEFAULT_UNIT_ROWS
+        self._snapshot = build_unit_snapshot(version, rows)
+        self._checked_at = now
+        log_event('units_loaded', version=version, units=len(self._snapshot.penjatahan))
+
+    def _check(self, now):
+        self.stats['checks'] += 1
+        try:
+            version = self._fetch_version()
+        except Exception as e:
+            if not (isinstance(e, APIError) and e.code in MISSING_TABLE_CODES):
+                # Keep serving the current snapshot; the next check retries
+                log_event('units_check_failed', level=logging.WARNING, error=str(e))
+                self._checked_at = now
+                return
+            version = 'builtin'
+        if version != self._snapshot.version:
+            self._load(now)
+        self._checked_at = now
+
+unit_registry = UnitRegistry(UNITS_CHECK_INTERVAL)
+
+def get_units():
+    """
+    Returns the active unit names of the current registry snapshot, sorted.
+    """
+    return unit_registry.snapshot().units
+
+# Custom strftime filter
+def format_datetime(value, format='%Y-%m-%d'):
+    if value == 'now':
+        return datetime.now().strftime(format)
+    # Ensure value is a datetime object before formatting
+    if isinstance(value, datetime):
+        return value.strftime(format)
+    return str(value) # Fallback to string conversion if not datetime
+
+app.jinja_env.filters['strftime'] = format_datetime
+
+# Helper functions
+RECORD_COLUMNS = [
+    "Date", "NO_UNIT", "HM_Awal", "HM_Akhir", "Selisih",
+    "Literan", "Penjatahan", "Max_Capacity", "Buffer_Stock", "is_new", "shift"
+]
+SHIFT_ORDER = {'Shift 1': 1, 'Shift 2': 2}
+# PostgREST caps every response at 1000 rows by default, so larger reads are paged
+SUPABASE_PAGE_SIZE = 1000
+# Postgres error code PostgREST passes through for a unique constraint violation
+UNIQUE_VIOLATION = '23505'
+# PostgREST reports a missing table as PGRST205 (older releases pass through 42P01)
+MISSING_TABLE_CODES = ('PGRST205', '42P01')
+
+def fetch_records(after_id=None, page_size=SUPABASE_PAGE_SIZE, filters=None, date_from=None, date_to=None, id_to=None):
+    """
+    Fetches raw fuel records from Supabase ordered by id, paging with the id as a cursor.
+    When after_id is given only rows newer than that id are returned (and with id_to only
+    rows up to that id); filters is an optional {column: value} dict of equality predicates,
+    and date_from/date_to bound the Date column inclusively. All predicates are applied
+    in the query.
+    """
+    return [
+        record
+        for batch in iter_record_pages(after_id, page_size, filters, date_from, date_to, id_to)
+        for record in batch
+    ]
+
+def iter_record_pages(after_id=None, page_size=SUPABASE_PAGE_SIZE, filters=None, date_from=None, date_to=None, id_to=None):
+    """
+    Yields the pages of fetch_records one at a time, for callers that stream them.
+    """
+    while True:
+        query = supabase.table('fuel_records').select('*')
+        for column, value in (filters or {}).items():
+            query = query.eq(column, value)
+        if date_from is not None:
+            query = query.gte('Date', date_from.strftime('%Y-%m-%d'))
+        if date_to is not None:
+            query = query.lte('Date', date_to.strftime('%Y-%m-%d'))
+        if after_id is not None:
+            query = query.gt('id', after_id)
+        if id_to is not None:
+            query = query.lte('id', id_to)
+        batch = query.order('id').limit(page_size).execute().data or []
+        if batch:
+            yield batch
+        if len(batch) < page_size:
+            return
+        after_id = batch[-1]['id']
+
+def fetch_all_records(page_size=SUPABASE_PAGE_SIZE):
+    """
+    Fetches every fuel record for a full cache load. The first page is read together with
+    the highest id; if there is more than one page, the remaining id range is split into
+    DB_WORKERS windows that are paged concurrently, so a large history waits on about
+    pages / DB_WORKERS round trips instead of one per page.
+    """
+    first_page, last = run_concurrently(
+        lambda: supabase.table('fuel_records').select('*').order('id').limit(page_size).execute().data or [],
+        lambda: supabase.table('fuel_records').select('id').order('id', desc=True).limit(1).execute().data or [],
+    )
+    if len(first_page) < page_size or not last:
+        return first_page
+    low, high = first_page[-1]['id'], last[0]['id']
+    windows = max(min(DB_WORKERS, -(-(high - low) // page_size)), 1)
+    step = -(-(high - low) // windows)
+    edges = [low + step * i for i in range(windows)] + [high]
+    parts = run_concurrently(*[
+        partial(fetch_records, after_id=edges[i], id_to=edges[i + 1], page_size=page_size)
+        for i in range(windows)
+    ])
+    # Rows inserted after the highest id was read are picked up by the next sync
+    return first_page + [record for part in parts for record in part]
+
+def fetch_records_for_day(report_date, shift=None):
+    """
+    Fetches the typed, sorted records of a single day, optionally limited to one shift.
+    The predicates run in Supabase (backed by the (Date, shift, NO_UNIT) index), so the
+    cost depends on the rows of that day rather than on the whole history.
+    """
+    mirror = record_mirror.table()
+    if mirror is not None:
+        return build_records_df_from_table(select_mirror_records(mirror, report_date, report_date, shift))
+    filters = {'Date': report_date.strftime('%Y-%m-%d')}
+    if shift is not None:
+        filters['shift'] = shift
+    return build_records_df(fetch_records(filters=filters))
+
+def fetch_records_for_range(date_from, date_to, shift=None):
+    """
+    Fetches the typed, sorted records between two dates (inclusive). Longer ranges are
+    split into up to DB_WORKERS date windows that are fetched concurrently.
+    """
+    mirror = record_mirror.table()
+    if mirror is not None:
+        return build_records_df_from_table(select_mirror_records(mirror, date_from, date_to, shift))
+    filters = {'shift': shift} if shift is not None else None
+    days = (date_to - date_from).days + 1
+    windows = min(DB_WORKERS, days)
+    step = -(-days // windows)
+    spans = [
+        (date_from + timedelta(days=start), min(date_from + timedelta(days=start + step - 1), date_to))
+        for start in range(0, days, step)
+    ]
+    parts = run_concurrently(*[
+        partial(fetch_records, filters=filters, date_from=span_from, date_to=span_to)
+        for span_from, span_to in spans
+    ])
+    return build_records_df([record for part in parts for record in part])
+
+# Schema of the cached frame (see build_records_df): HM readings stay float64 because
+# values like 46203.25 need more than float32's ~7 significant digits, while the
+# per-shift quantities fit in float32. NO_UNIT and shift only have a handful of
+# distinct values and are stored as categoricals.
+CATEGORICAL_COLUMNS = ["NO_UNIT", "shift"]
+FLOAT32_COLUMNS = ["Selisih", "Literan", "Max_Capacity", "Buffer_Stock"]
+
+def sort_records(df):
+    """
+    Sorts records chronologically by Date and Shift using a single stable integer key.
+    Rows without a valid Date are placed last.
+    """
+    days = df['Date'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+    days = np.where(df['Date'].isna().to_numpy(), np.iinfo(np.int64).max // 8, days)
+    order = np.argsort(days * 4 + df['shift_order'].to_numpy(), kind='stable')
+    return df.take(order)
+
+def concat_records(left, right):
+    """
+    Concatenates two typed record frames, keeping the categorical columns categorical.
+    """
+    # pandas deprecates how concat types the result when an operand is empty
+    if right.empty:
+        return left
+    if left.empty:
+        return sort_records(right.reset_index(drop=True))
+    df = pd.concat([left, right], ignore_index=True)
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = pd.api.types.union_categoricals([left[col].array, right[col].array])
+    return sort_records(df)
+
+def build_records_df(records):
+    """
+    Builds the typed, chronologically sorted DataFrame from raw Supabase rows.
+    Every column is converted straight to its final dtype in one pass, and the
+    integer 'shift_order' column (Shift 1 = 1, Shift 2 = 2, anything else = 3)
+    is kept as the sort key.
+    """
+    def values(col):
+        return [record.get(col) for record in records]
+
+    def float_values(col):
+        return np.round(np.array(values(col), dtype=np.float64), 2)
+
+    def text_values(col):
+        # Missing values become empty strings, like the old 'nan' cleanup of the shift column
+        return pd.Categorical(['' if value is None else str(value).strip() for value in values(col)])
+
+    shift = text_values("shift")
+    columns = {
+        # errors='coerce' will turn unparseable dates into NaT (Not a Time)
+        "Date": pd.to_datetime(pd.Series(values("Date"), dtype=object), errors='coerce'),
+        "NO_UNIT": text_values("NO_UNIT"),
+        "HM_Awal": float_values("HM_Awal"),
+        "HM_Akhir": float_values("HM_Akhir"),
+        "Selisih": float_values("Selisih").astype(np.float32),
+        "Literan": float_values("Literan").astype(np.float32),
+        "Penjatahan": np.nan_to_num(np.array(values("Penjatahan"), dtype=np.float64)).astype(np.int16),
+        "Max_Capacity": float_values("Max_Capacity").astype(np.float32),
+        "Buffer_Stock": float_values("Buffer_Stock").astype(np.float32),
+        "is_new": np.array(values("is_new"), dtype=bool),
+        "shift": shift,
+        # Look the order up once per category and broadcast it through the category codes
+        "shift_order": np.array([SHIFT_ORDER.get(value, 3) for value in shift.categories], dtype=np.int8)[shift.codes],
+    }
+    # Any other columns Supabase returns (id, created_at) are kept as they come
+    for col in (records[0].keys() if records else ()):
+        if col not in columns:
+            columns[col] = values(col)
+    return sort_records(pd.DataFrame(columns))
+
+def build_records_df_from_table(table):
+    """
+    Builds the same typed, sorted frame as build_records_df from an Arrow table of raw
+    records (see RecordMirror). Numeric columns are read straight from the Arrow
+    buffers, and text and dates are converted once per distinct value instead of per row.
+    """
+    def float_values(col):
+        return np.round(table.column(col).to_numpy().astype(np.float64, copy=False), 2)
+
+    def encoded(col):
+        # (distinct values, codes) with -1 for nulls
+        array = pc.dictionary_encode(table.column(col).combine_chunks())
+        return array.dictionary.to_pylist(), pc.fill_null(array.indices, -1).to_numpy()
+
+    def text_values(col):
+        # Missing values become empty strings, like build_records_df
+        values, codes = encoded(col)
+        labels = np.array(['' if value is None else str(value).strip() for value in values] + [''], dtype=object)
+        categories, inverse = np.unique(labels, return_inverse=True)
+        return pd.Categorical.from_codes(inverse[codes], categories=categories).remove_unused_categories()
+
+    def date_values(col):
+        values, codes = encoded(col)
+        parsed = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype='datetime64[ns]')
+        return np.append(parsed, np.datetime64('NaT', 'ns'))[codes]
+
+    shift = text_values("shift")
+    columns = {
+        "Date": date_values("Date"),
+        "NO_UNIT": text_values("NO_UNIT"),
+        "HM_Awal": float_values("HM_Awal"),
+        "HM_Akhir": float_values("HM_Akhir"),
+        "Selisih": float_values("Selisih").astype(np.float32),
+        "Literan": float_values("Literan").astype(np.float32),
+        "Penjatahan": np.nan_to_num(table.column("Penjatahan").to_numpy().astype(np.float64)).astype(np.int16),
+        "Max_Capacity": float_values("Max_Capacity").astype(np.float32),
+        "Buffer_Stock": float_values("Buffer_Stock").astype(np.float32),
+        "is_new": pc.fill_null(table.column("is_new"), False).to_numpy(),
+        "shift": shift,
+        "shift_order": np.array([SHIFT_ORDER.get(value, 3) for value in shift.categories], dtype=np.int8)[shift.codes],
+        "id": table.column("id").to_numpy(),
+        "created_at": table.column("created_at").to_pylist(),
+    }
+    return sort_records(pd.DataFrame(columns))
+
+class RecordCache:
+    """
+    Process-level cache of the typed, sorted fuel_records DataFrame.
+
+    A full load happens on first use and whenever the TTL expires. In between, the
+    cache only asks Supabase for rows with an id above its high-water mark, and local
+    writes patch the cached frame directly. The cached frame is shared between
+    requests and must be treated as read-only; updates always build a new frame.
+
+    Alongside the frame it maintains a unit -> latest (Date, shift, HM_Akhir) index,
+    so the latest HM of a unit is a dictionary lookup instead of a scan of its history.
+    Subscribers are told which units gained rows (or None after a full reload or purge)
+    so derived per-unit data can be refreshed for those units only.
+    """
+
+    def __init__(self, ttl, sync_interval):
+        self.ttl = ttl
+        self.sync_interval = sync_interval
+        self.stats = Counter()
+        self._lock = threading.RLock()
+        self._df = None
+        self._max_id = None
+        self._patched_ids = set()
+        self._latest = {}
+        self._listeners = []
+        self._prefetching = None
+        self._loaded_at = 0.0
+        self._synced_at = 0.0
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._df is None or now - self._loaded_at > self.ttl:
+                self.stats['misses'] += 1
+                self._reload(now)
+            else:
+                self.stats['hits'] += 1
+                if now - self._synced_at > self.sync_interval:
+                    self._sync(now)
+            return self._df
+
+    def get_if_loaded(self):
+        """
+        Returns the frame like get() when it is loaded and within its TTL, or None
+        instead of starting a full load.
+        """
+        with self._lock:
+            if self._df is None or time.monotonic() - self._loaded_at > self.ttl:
+                return None
+            return self.get()
+
+    def add(self, *records):
+        """
+        Write-through patch for rows this process just inserted.
+        The high-water mark is left alone so rows written elsewhere in between are still synced.
+        """
+        with self._lock:
+            records = [record for record in records if record.get('id') is not None]
+            if not records:
+                return
+            if self._df is None:
+                # Nothing to patch, but subscribers still hear about the write
+                self._notify_units({record.get('NO_UNIT') for record in records})
+                return
+            self._patched_ids.update(record['id'] for record in records)
+            with timed('frame_build'):
+                records_df = build_records_df(records)
+                self._df = concat_records(self._df, records_df)
+            self._index_latest(records_df)
+            self._notify(records_df)
+
+    def latest(self, no_unit):
+        """
+        Returns the latest {'Date', 'shift', 'HM_Akhir'} entry for a unit as of the last refresh,
+        or None if the unit has no records.
+        """
+        with self._lock:
+            entry = self._latest.get(no_unit)
+            return entry[1] if entry else None
+
+    def fingerprint(self):
+        """
+        Returns 'rows@highest id' of the cached frame, so responses built from the cache
+        are tagged with the data they were built from.
+        """
+        df = self.get()
+        return f"{len(df)}@{int(df['id'].max()) if 'id' in df.columns and not df.empty else None}"
+
+    def subscribe(self, callback):
+        """
+        Registers callback(units) to be called with the set of units that changed,
+        or with None when the whole frame was replaced.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def purge(self):
+        with self._lock:
+            self.stats['purges'] += 1
+            self._df = None
+            self._max_id = None
+            self._patched_ids.clear()
+            self._latest = {}
+            self._notify(None)
+
+    def info(self):
+        with self._lock:
+            return {
+                **self.stats,
+                'rows': 0 if self._df is None else len(self._df),
+                'max_id': self._max_id,
+                'indexed_units': len(self._latest),
+                'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._df is not None else None,
+                'ttl_seconds': self.ttl,
+            }
+
+    def prefetch(self):
+        """
+        Starts a due reload or sync on the database pool, so it overlaps with the rest of
+        the request's setup (such as loading the session user); get() then waits on the
+        lock until it is done. Does nothing when the cache is fresh or already busy.
+        """
+        if db_executor is None or not self._lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            due = (self._df is None or now - self._loaded_at > self.ttl
+                   or now - self._synced_at > self.sync_interval)
+            if due and (self._prefetching is None or self._prefetching.done()):
+                self.stats['prefetches'] += 1
+                self._prefetching = db_executor.submit(self.get)
+        finally:
+            self._lock.release()
+
+    def _reload(self, now):
+        mirror = record_mirror.table()
+        if mirror is not None:
+            with timed('frame_build'):
+                self._df = build_records_df_from_table(mirror)
+            self._max_id = pc.max(mirror.column('id')).as_py()
+        else:
+            records = fetch_all_records()
+            with timed('frame_build'):
+                self._df = build_records_df(records)
+            self._max_id = max((r['id'] for r in records), default=None)
+        self._patched_ids.clear()
+        self._latest = {}
+        self._index_latest(self._df)
+        self._notify(None)
+        self._loaded_at = self._synced_at = now
+
+    def _sync(self, now):
+        self.stats['syncs'] += 1
+        records = fetch_records(after_id=self._max_id)
+        self._synced_at = now
+        if not records:
+            return
+        self._max_id = max(self._max_id or 0, max(r['id'] for r in records))
+        fresh = [r for r in records if r['id'] not in self._patched_ids]
+        self._patched_ids.difference_update(r['id'] for r in records)
+        if fresh:
+            self.stats['synced_rows'] += len(fresh)
+            with timed('frame_build'):
+                fresh_df = build_records_df(fresh)
+                self._df = concat_records(self._df, fresh_df)
+            self._index_latest(fresh_df)
+            self._notify(fresh_df)
+
+    def _notify(self, df):
+        self._notify_units(None if df is None else set(df['NO_UNIT'].unique().tolist()))
+
+    def _notify_units(self, units):
+        for callback in self._listeners:
+            callback(units)
+
+    def _index_latest(self, df):
+        # df is sorted, so the last row per unit is that unit's newest record in df;
+        # it only replaces the indexed entry if it is newer than what is already there
+        last_rows = df.drop_duplicates('NO_UNIT', keep='last')
+        has_id = 'id' in last_rows.columns
+        for position, (unit, date, shift, hm_akhir) in enumerate(
+            zip(last_rows['NO_UNIT'], last_rows['Date'], last_rows['shift'], last_rows['HM_Akhir'])
+        ):
+            record_id = last_rows['id'].iat[position] if has_id else 0
+            key = (date, SHIFT_ORDER.get(shift, 3), record_id)
+            current = self._latest.get(unit)
+            if current is None or key >= current[0]:
+                self._latest[unit] = (key, {'Date': date, 'shift': shift, 'HM_Akhir': float(hm_akhir)})
+
+record_cache = RecordCache(
+    ttl=float(os.environ.get('RECORD_CACHE_TTL', 300)),
+    sync_interval=float(os.environ.get('RECORD_CACHE_SYNC_INTERVAL', 5)),
+)
+
+# Endpoints that read the record cache start its due refresh before login_required
+# loads the session user, so the two round trips overlap
+RECORD_PREFETCH_ENDPOINTS = {'index', 'api_records', 'api_forecast'}
+
+@app.before_request
+def prefetch_records():
+    if request.endpoint in RECORD_PREFETCH_ENDPOINTS and session.get('_user_id'):
+        record_cache.prefetch()
+
+DATA_VERSION_CHECK_INTERVAL = float(os.environ.get('DATA_VERSION_CHECK_INTERVAL', 5))
+
+DATA_VERSION_TABLE = 'data_versions'
+
+DataFingerprint = namedtuple('DataFingerprint', ['version', 'generation', 'last_modified'])
+
+def parse_timestamp(value):
+    """
+    Parses a Supabase timestamp, or returns None when it is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+class DataVersion:
+    """
+    Version of fuel_records used for ETag and Last-Modified headers and by the record
+    mirror, read from fuel_records' rows in the data_versions table. Statement triggers
+    keep one counter row per unit, bumping its version on every insert, update, delete
+    and truncate that touches the unit, and its generation when existing rows are
+    updated or removed; the sums over all rows are the table's version and generation,
+    and the newest updated_at is the time of the last write.
+
+    Reading it is a primary-key range read of a few rows, repeated at most every
+    check_interval seconds and right after this process writes (record cache
+    subscribers hear about every write). Without the data_versions migration it falls back to the highest id (the
+    version) and the lowest id (the generation), two index lookups that catch inserts,
+    resets and rewrites but not in-place updates.
+    """
+
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._value = None
+        self._checked_at = 0.0
+        self._table_available = None
+
+    def current(self):
+        """
+        Returns (version, last_modified); last_modified is None when it is unknown.
+        """
+        fingerprint = self.fingerprint()
+        return f"{fingerprint.generation}.{fingerprint.version}", fingerprint.last_modified
+
+    def fingerprint(self):
+        """
+        Returns the DataFingerprint (version, generation, last_modified) the version is made of.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._value is None or now - self._checked_at >= self.check_interval:
+                self.stats['checks'] += 1
+                self._value = self._fetch()
+                self._checked_at = now
+            return self._value
+
+    def invalidate(self, units=None):
+        with self._lock:
+            self._value = None
+
+    def info(self):
+        value = self._value
+        return {
+            **self.stats,
+            'version': f"{value.generation}.{value.version}" if value else None,
+            'source': {True: DATA_VERSION_TABLE, False: 'ids', None: None}[self._table_available],
+            'check_interval_seconds': self.check_interval,
+        }
+
+    def _fetch(self):
+        with timed('data_version'):
+            if self._table_available is not False:
+                try:
+                    response = (
+                        supabase.table(DATA_VERSION_TABLE).select('version,generation,updated_at')
+                        .eq('name', 'fuel_records').execute()
+                    )
+                except APIError as e:
+                    if e.code not in MISSING_TABLE_CODES:
+                        raise
+                    response = None
+                if response is not None and response.data:
+                    self._table_available = True
+                    rows = response.data
+                    written = [parse_timestamp(row.get('updated_at')) for row in rows]
+                    return DataFingerprint(
+                        sum(row['version'] for row in rows),
+                        sum(row['generation'] for row in rows),
+                        max((stamp for stamp in written if stamp), default=None),
+                    )
+                self._table_available = False
+                log_event('data_version_table_missing', level=logging.WARNING, table=DATA_VERSION_TABLE)
+            newest, oldest = run_concurrently(
+                lambda: supabase.table('fuel_records').select('id,created_at').order('id', desc=True).limit(1).execute().data,
+                lambda: supabase.table('fuel_records').select('id').order('id').limit(1).execute().data,
+            )
+        newest = newest[0] if newest else {}
+        return DataFingerprint(newest.get('id') or 0, oldest[0]['id'] if oldest else None,
+                               parse_timestamp(newest.get('created_at')))
+
+data_version = DataVersion(DATA_VERSION_CHECK_INTERVAL)
+record_cache.subscribe(data_version.invalidate)
+
+RECORD_MIRROR_DIR = os.environ.get('RECORD_MIRROR_DIR')
+RECORD_MIRROR_MAX_SEGMENTS = int(os.environ.get('RECORD_MIRROR_MAX_SEGMENTS', 16))
+# Raw fuel_records columns kept in the mirror, with their Arrow type aliases
+MIRROR_COLUMN_TYPES = {
+    'id': 'int64', 'created_at': 'string', 'Date': 'string', 'NO_UNIT': 'string',
+    'HM_Awal': 'double', 'HM_Akhir': 'double', 'Selisih': 'double', 'Literan': 'double',
+    'Penjatahan': 'int64', 'Max_Capacity': 'double', 'Buffer_Stock': 'double',
+    'is_new': 'bool', 'shift': 'string',
+}
+
+def records_to_table(records):
+    """
+    Converts raw Supabase rows to an Arrow table with the mirror's fixed schema.
+    """
+    def convert(value, alias):
+        if value is None:
+            return None
+        return int(value) if alias == 'int64' else str(value) if alias == 'string' else value
+
+    return pa.table({
+        col: pa.array([convert(record.get(col), alias) for record in records], type=pa.type_for_alias(alias))
+        for col, alias in MIRROR_COLUMN_TYPES.items()
+    })
+
+class RecordMirror:
+    """
+    Optional local copy of fuel_records as Parquet segment files, read through memory maps.
+
+    Turned on by RECORD_MIRROR_DIR when pyarrow is installed. Segments are append-only
+    by id: a sync compares the table's version and generation (see DataVersion) with
+    the ones the mirror was synced to, fetches only the rows above the mirror's highest
+    id when just the version moved, and rebuilds from scratch when the generation
+    changed (rows updated or removed by reset, repair, restore). Past max_segments
+    files the segments are compacted into one. Every read syncs first, so Supabase only
+    serves the version and new rows. The directory may be shared by several processes;
+    they take turns through a lock file.
+    """
+
+    def __init__(self, directory, max_segments):
+        self.directory = directory
+        self.max_segments = max_segments
+        self.enabled = bool(directory) and PYARROW_AVAILABLE
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._loaded = ((), None)
+        if directory and not PYARROW_AVAILABLE:
+            log_event('record_mirror_unavailable', level=logging.WARNING, error='pyarrow is not installed')
+
+    def table(self):
+        """
+        Returns the synced mirror as an Arrow table in id order, or None when the mirror
+        is off or failed (callers then read Supabase directly).
+        """
+        if not self.enabled:
+            return None
+        try:
+            with self._lock, self._file_lock():
+                self._sync()
+                return self._read()
+        except Exception as e:
+            self.stats['failures'] += 1
+            log_event('record_mirror_failed', level=logging.WARNING, error=str(e))
+            return None
+
+    def purge(self):
+        """
+        Deletes the local files; the next read rebuilds the mirror.
+        """
+        if not self.enabled:
+            return
+        with self._lock, self._file_lock():
+            self._reset(self._read_manifest())
+
+    def info(self):
+        manifest = self._manifest
+        return {
+            **self.stats,
+            'enabled': self.enabled,
+            'rows': manifest['rows'] if manifest else None,
+            'max_id': manifest['max_id'] if manifest else None,
+            'version': manifest.get('version') if manifest else None,
+            'segments': len(manifest['segments']) if manifest else None,
+        }
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync(self):
+        fingerprint = data_version.fingerprint()
+        manifest = self._read_manifest()
+        synced_to = (fingerprint.generation, fingerprint.version)
+        with timed('mirror_sync'):
+            if manifest.get('version') is None or manifest.get('generation') != fingerprint.generation:
+                # First sync, or existing rows were updated or removed: start over
+                if manifest['rows']:
+                    self.stats['rebuilds'] += 1
+                    self._reset(manifest)
+                self._append(manifest, fetch_all_records())
+            elif manifest['version'] != fingerprint.version:
+                self.stats['syncs'] += 1
+                self._append(manifest, fetch_records(after_id=manifest['max_id']))
+            if (manifest.get('generation'), manifest.get('version')) != synced_to:
+                manifest.update(generation=fingerprint.generation, version=fingerprint.version)
+                self._write_manifest(manifest)
+            if len(manifest['segments']) > self.max_segments:
+                self._compact(manifest)
+
+    def _read(self):
+        # Rebuilt segments reuse their id-range names, so the generation is part of the key
+        names = (self._manifest.get('generation'),) + tuple(s['file'] for s in self._manifest['segments'])
+        if self._loaded[0] != names or self._loaded[1] is None:
+            with timed('mirror_read'):
+                tables = [pq.read_table(os.path.join(self.directory, name), memory_map=True) for name in names[1:]]
+                self._loaded = (names, pa.concat_tables(tables) if tables else records_to_table([]))
+        return self._loaded[1]
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.directory, 'manifest.json')) as f:
+                self._manifest = json.load(f)
+        except FileNotFoundError:
+            self._manifest = {'rows': 0, 'max_id': None, 'segments': [], 'version': None, 'generation': None}
+        return self._manifest
+
+    def _write_manifest(self, manifest):
+        path = os.path.join(self.directory, 'manifest.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(path + '.tmp', path)
+        self._manifest = manifest
+
+    def _write_segment(self, manifest, table, first_id, last_id):
+        name = f'segment-{first_id:012d}-{last_id:012d}.parquet'
+        path = os.path.join(self.directory, name)
+        pq.write_table(table, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        manifest['segments'].append({'file': name, 'first_id': first_id, 'last_id': last_id, 'rows': table.num_rows})
+        manifest['rows'] += table.num_rows
+        manifest['max_id'] = max(manifest['max_id'] or 0, last_id)
+
+    def _append(self, manifest, records):
+        if not records:
+            return
+        self._write_segment(manifest, records_to_table(records), records[0]['id'], max(r['id'] for r in records))
+        self._write_manifest(manifest)
+
+    def _compact(self, manifest):
+        self.stats['compactions'] += 1
+        old = manifest['segments']
+        table = pa.concat_tables([pq.read_table(os.path.join(self.directory, s['file'])) for s in old])
+        manifest.update(rows=0, segments=[])
+        self._write_segment(manifest, table, old[0]['first_id'], old[-1]['last_id'])
+        self._write_manifest(manifest)
+        for segment in old:
+            if segment['file'] != manifest['segments'][0]['file']:
+                os.remove(os.path.join(self.directory, segment['file']))
+
+    def _reset(self, manifest):
+        for segment in manifest['segments']:
+            path = os.path.join(self.directory, segment['file'])
+            if os.path.exists(path):
+                os.remove(path)
+        manifest.update(rows=0, max_id=None, segments=[], version=None, generation=None)
+        self._write_manifest(manifest)
+        self._loaded = ((), None)
+
+record_mirror = RecordMirror(RECORD_MIRROR_DIR, RECORD_MIRROR_MAX_SEGMENTS)
+
+def select_mirror_records(table, date_from, date_to, shift=None):
+    """
+    Filters mirror rows to a Date range (inclusive) and optionally one shift.
+    """
+    mask = pc.and_(
+        pc.greater_equal(table['Date'], date_from.strftime('%Y-%m-%d')),
+        pc.less_equal(table['Date'], date_to.strftime('%Y-%m-%d')),
+    )
+    if shift is not None:
+        mask = pc.and_(mask, pc.equal(table['shift'], shift))
+    return table.filter(mask)
+
+def conditional_response(scope, build, from_cache=False):
+    """
+    Answers a GET with 304 Not Modified when the client's copy of this resource is
+    current, without calling build(); otherwise returns build() tagged with an ETag and
+    Last-Modified. scope identifies the resource (route plus its parameters).
+    Records and the unit registry together make up the version; from_cache takes the
+    records' version from the record cache for responses built from it.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return build()
+    try:
+        if from_cache:
+            version, last_modified = record_cache.fingerprint(), None
+        else:
+            version, last_modified = data_version.current()
+    except Exception as e:
+        log_event('data_version_failed', level=logging.WARNING, error=str(e))
+        return build()
+    etag = hashlib.sha1(
+        json.dumps([version, unit_registry.snapshot().version, scope], default=str).encode()
+    ).hexdigest()[:24]
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        data_version.stats['not_modified'] += 1
+        response = Response(status=304)
+    else:
+        response = build()
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # The browser keeps the copy but revalidates it on every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def load_or_create_data():
+    """
+    Returns the fuel records as a Pandas DataFrame sorted chronologically by Date and Shift.
+    Served from the process-level record cache; do not modify the returned frame in place.
+    """
+    try:
+        return record_cache.get()
+    except Exception as e:
+        log_event('load_records_failed', level=logging.ERROR, error=str(e))
+        # Returning an empty DataFrame might prevent a full app crash
+        return build_records_df([])
+
+def save_data(df):
+    """
+    Saves the DataFrame back to Supabase. This function clears all existing records
+    and then inserts all records from the DataFrame.
+    Only used by the admin repair route; regular entries go through insert_record().
+    """
+    try:
+        # Delete all existing records in Supabase (as per original logic)
+        supabase.table('fuel_records').delete().gte('id', 0).execute()
+        
+        records_to_insert = []
+        for _, row in df.iterrows():
+            record = {
+                # Convert datetime objects in 'Date' column back to string for Supabase
+                "Date": row["Date"].strftime("%Y-%m-%d") if pd.notna(row["Date"]) else None,
+                "NO_UNIT": str(row["NO_UNIT"]).strip(),
+                "HM_Awal": float(row["HM_Awal"]),
+                "HM_Akhir": float(row["HM_Akhir"]),
+                "Selisih": round(float(row["Selisih"]), 2),
+                "Literan": round(float(row["Literan"]), 2),
+                "Penjatahan": int(row["Penjatahan"]),
+                "Max_Capacity": round(float(row["Max_Capacity"]), 2),
+                "Buffer_Stock": round(float(row["Buffer_Stock"]), 2),
+                "is_new": bool(row["is_new"]),
+                "shift": str(row.get("shift", "")).strip()
+            }
+            records_to_insert.append(record)
+        
+        # Perform a batch insert if there are records to insert
+        if records_to_insert:
+            supabase.table('fuel_records').insert(records_to_insert).execute()
+    except Exception as e:
+        log_event('save_records_failed', level=logging.ERROR, error=str(e))
+        raise
+    finally:
+        record_cache.purge()
+
+def insert_record(record):
+    """
+    Appends a single record to Supabase and returns the inserted row.
+    Only the new row crosses the wire, so write latency does not grow with the table.
+    """
+    try:
+        response = supabase.table('fuel_records').insert(record).execute()
+        inserted = response.data[0] if response.data else record
+        record_cache.add(inserted)
+        return inserted
+    except Exception as e:
+        log_event('insert_record_failed', level=logging.ERROR, unit=record.get('NO_UNIT'), error=str(e))
+        raise
+
+def get_latest_record(no_unit):
+    """
+    Fetches the most recent record (by Date, then shift) for a unit straight from Supabase.
+    Backed by the (NO_UNIT, Date, shift) index, so only one row is read.
+    """
+    response = (
+        supabase.table('fuel_records')
+        .select('id, Date, shift, HM_Akhir')
+        .eq('NO_UNIT', no_unit)
+        .order('Date', desc=True)
+        .order('shift', desc=True)
+        .order('id', desc=True)
+        .limit(1)
+        .execute()
+    )
+    return response.data[0] if response.data else None
+
+def fetch_latest_records(no_unit, limit):
+    """
+    Fetches a unit's most recent `limit` records (newest first) from the same index as
+    get_latest_record, so the cost depends on limit rather than on the unit's history.
+    """
+    response = (
+        supabase.table('fuel_records')
+        .select('*')
+        .eq('NO_UNIT', no_unit)
+        .order('Date', desc=True)
+        .order('shift', desc=True)
+        .order('id', desc=True)
+        .limit(limit)
+        .execute()
+    )
+    return response.data or []
+
+def get_latest_hm(no_unit):
+    """
+    Returns the latest HM_Akhir for a unit without loading its history.
+    Falls back to the initial HM_Awal when the unit has no records yet.
+    """
+    latest = get_latest_record(no_unit)
+    if latest and latest.get("HM_Akhir") is not None:
+        return float(latest["HM_Akhir"])
+    return unit_registry.snapshot().initial_hm_awal.get(no_unit, 0.0)
+
+def reset_data():
+    try:
+        supabase.table('fuel_records').delete().gte('id', 0).execute()
+    except Exception as e:
+        log_event('reset_records_failed', level=logging.ERROR, error=str(e))
+        raise
+    finally:
+        record_cache.purge()
+
+# Backups are gzip CSV chunks of fuel_records plus a manifest of their id ranges. Each
+# backup only appends the rows above the manifest's highest id; a full rewrite of the
+# table (repair or reset, which assign new ids) starts a new generation. Chunks go to the
+# Supabase Storage bucket BACKUP_BUCKET when set, since a serverless filesystem does not
+# persist, and to BACKUP_DIR otherwise.
+BACKUP_BUCKET = os.environ.get('BACKUP_BUCKET')
+BACKUP_DIR = os.environ.get('BACKUP_DIR', 'backups')
+BACKUP_CHUNK_ROWS = int(os.environ.get('BACKUP_CHUNK_ROWS', 50000))
+BACKUP_RESTORE_BATCH_SIZE = int(os.environ.get('BACKUP_RESTORE_BATCH_SIZE', 500))
+BACKUP_MANIFEST = 'manifest.json'
+BACKUP_COLUMNS = ["id"] + RECORD_COLUMNS + ["created_at"]
+BACKUP_TYPES = {
+    "id": int, "HM_Awal": float, "HM_Akhir": float, "Selisih": float, "Literan": float,
+    "Penjatahan": int, "Max_Capacity": float, "Buffer_Stock": float,
+    "is_new": lambda value: value == 'True',
+}
+_backup_lock = threading.Lock()
+
+class LocalBackupStore:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def read(self, name):
+        try:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a crash never leaves a truncated manifest or chunk
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def __str__(self):
+        return os.path.abspath(self.directory)
+
+class StorageBackupStore:
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def read(self, name):
+        from storage3.utils import StorageException
+
+        try:
+            return supabase.storage.from_(self.bucket).download(name)
+        except StorageException:
+            return None
+
+    def write(self, name, data):
+        supabase.storage.from_(self.bucket).upload(
+            name, data, {'content-type': 'application/octet-stream', 'upsert': 'true'}
+        )
+
+    def __str__(self):
+        return f'storage://{self.bucket}'
+
+def get_backup_store():
+    return StorageBackupStore(BACKUP_BUCKET) if BACKUP_BUCKET else LocalBackupStore(BACKUP_DIR)
+
+def read_backup_manifest(store):
+    data = store.read(BACKUP_MANIFEST)
+    if data is None:
+        return {'format': 1, 'table': 'fuel_records', 'columns': BACKUP_COLUMNS, 'generations': []}
+    return json.loads(data)
+
+def encode_backup_chunk(records):
+    buffer = BytesIO()
+    # mtime=0 keeps the bytes (and checksum) identical for identical rows
+    with TextIOWrapper(gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0), encoding='utf-8', newline='') as text:
+        writer = csv.writer(text)
+        writer.writerow(BACKUP_COLUMNS)
+        writer.writerows([record.get(col) for col in BACKUP_COLUMNS] for record in records)
+    return buffer.getvalue()
+
+def decode_backup_chunk(data):
+    with TextIOWrapper(gzip.GzipFile(fileobj=BytesIO(data)), encoding='utf-8', newline='') as text:
+        records = []
+        for row in csv.DictReader(text):
+            records.append({
+                col: (BACKUP_TYPES.get(col, str)(value) if value != '' else None)
+                for col, value in row.items()
+            })
+        return records
+
+def backup_data():
+    """
+    Appends every fuel record added since the last backup as gzip CSV chunks and records
+    their id ranges in the manifest. Only the new rows are read, so the cost follows what
+    changed since the previous backup rather than the size of the history.
+    Returns a summary dict.
+    """
+    with _backup_lock:
+        store = get_backup_store()
+        manifest = read_backup_manifest(store)
+        lowest = supabase.table('fuel_records').select('id').order('id').limit(1).execute().data
+        if not lowest:
+            return {'rows': 0, 'chunks': 0, 'generation': None, 'store': str(store)}
+
+        generation = manifest['generations'][-1] if manifest['generations'] else None
+        if generation is None or lowest[0]['id'] > generation['max_id']:
+            # Every row backed up so far is gone, so the table was rewritten or reset
+            generation = {
+                'id': datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ'),
+                'created_at': datetime.now(timezone.utc).isoformat(),
+                'max_id': 0,
+                'rows': 0,
+                'chunks': [],
+            }
+            manifest['generations'].append(generation)
+
+        pending, written, rows = [], 0, 0
+        for page in iter_record_pages(after_id=generation['max_id'] or None):
+            pending.extend(page)
+            while len(pending) >= BACKUP_CHUNK_ROWS:
+                _write_backup_chunk(store, generation, pending[:BACKUP_CHUNK_ROWS])
+                rows += BACKUP_CHUNK_ROWS
+                written += 1
+                del pending[:BACKUP_CHUNK_ROWS]
+        if pending:
+            _write_backup_chunk(store, generation, pending)
+            rows += len(pending)
+            written += 1
+        if written:
+            # The manifest is written last, so it never lists a chunk that is not stored
+            store.write(BACKUP_MANIFEST, json.dumps(manifest, indent=2).encode('utf-8'))
+        summary = {'rows': rows, 'chunks': written, 'generation': generation['id'],
+                   'max_id': generation['max_id'], 'store': str(store)}
+        log_event('backup_written', **summary)
+        return summary
+
+def _write_backup_chunk(store, generation, records):
+    first_id, last_id = records[0]['id'], records[-1]['id']
+    data = encode_backup_chunk(records)
+    name = f"{generation['id']}/fuel_records_{first_id:010d}_{last_id:010d}.csv.gz"
+    store.write(name, data)
+    generation['chunks'].append({
+        'file': name,
+        'first_id': first_id,
+        'last_id': last_id,
+        'rows': len(records),
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+    })
+    generation['max_id'] = last_id
+    generation['rows'] += len(records)
+
+def restore_backup(generation_id=None, up_to_id=None, batch_size=BACKUP_RESTORE_BATCH_SIZE, force=False):
+    """
+    Upserts a backup generation (the latest by default) back into fuel_records in batches,
+    optionally only up to a given id. Chunks whose id range is already fully present in
+    the table are skipped unless force is set, so restoring after a partial loss or an
+    interrupted restore only loads the missing chunks. Returns a summary dict.
+    """
+    store = get_backup_store()
+    manifest = read_backup_manifest(store)
+    generations = manifest['generations']
+    if generation_id is not None:
+        generations = [generation for generation in generations if generation['id'] == generation_id]
+    if not generations:
+        raise ValueError(f"Backup generation not found in {store}: {generation_id or '(none)'}")
+    generation = generations[-1]
+
+    restored, skipped = 0, 0
+    try:
+        for chunk in generation['chunks']:
+            if up_to_id is not None and chunk['first_id'] > up_to_id:
+                break
+            if not force:
+                present = (
+                    supabase.table('fuel_records').select('id', count='exact')
+                    .gte('id', chunk['first_id']).lte('id', chunk['last_id']).limit(1).execute().count
+                )
+                if present == chunk['rows']:
+                    skipped += 1
+                    continue
+            data = store.read(chunk['file'])
+            if data is None or hashlib.sha256(data).hexdigest() != chunk['sha256']:
+                raise ValueError(f"Backup chunk {chunk['file']} is missing or corrupt")
+            records = decode_backup_chunk(data)
+            if up_to_id is not None:
+                records = [record for record in records if record['id'] <= up_to_id]
+            for start in range(0, len(records), batch_size):
+                supabase.table('fuel_records').upsert(records[start:start + batch_size], on_conflict='id').execute()
+            restored += len(records)
+        if restored:
+            _sync_record_id_sequence()
+    finally:
+        record_cache.purge()
+    summary = {'generation': generation['id'], 'rows': restored, 'skipped_chunks': skipped, 'store': str(store)}
+    log_event('backup_restored', **summary)
+    return summary
+
+def _sync_record_id_sequence():
+    # Restored rows keep their ids, so the identity sequence has to move past them
+    try:
+        supabase.rpc('sync_fuel_records_id_sequence', {}).execute()
+    except APIError as e:
+        log_event('id_sequence_sync_failed', level=logging.WARNING, error=e.message)
+
+@app.cli.command('backup')
+def backup_command():
+    """Append fuel records added since the last backup."""
+    click.echo(json.dumps(backup_data()))
+
+@app.cli.command('restore-backup')
+@click.option('--generation', 'generation_id', default=None, help='Generation id from the manifest (default: latest).')
+@click.option('--up-to-id', type=int, default=None, help='Restore only rows with an id up to this value.')
+@click.option('--batch-size', type=int, default=BACKUP_RESTORE_BATCH_SIZE, show_default=True)
+@click.option('--force', is_flag=True, help='Also reload chunks whose rows are all present.')
+def restore_backup_command(generation_id, up_to_id, batch_size, force):
+    """Bulk-load a backup generation back into fuel_records."""
+    click.echo(json.dumps(restore_backup(generation_id, up_to_id, batch_size, force)))
+
+def get_hm_awal(no_unit):
+    """
+    Gets the last HM_Akhir for a given unit from the record cache's per-unit index.
+    If no records exist for the unit, it returns the initial HM_Awal.
+    """
+    latest = record_cache.latest(no_unit)
+    if latest is not None:
+        return latest["HM_Akhir"]
+    return unit_registry.snapshot().initial_hm_awal.get(no_unit, 0.0)
+
+def get_penjatahan(no_unit, registry=None):
+    """
+    Returns the unit's Penjatahan from the unit registry, or None for an unregistered unit.
+    Pass the snapshot a caller already holds so all its lookups see the same registry.
+    """
+    return (registry or unit_registry.snapshot()).penjatahan.get(no_unit)
+
+def get_max_capacity(no_unit, registry=None):
+    """
+    Returns the unit's Max_Capacity from the unit registry, or None for an unregistered unit.
+    Pass the snapshot a caller already holds so all its lookups see the same registry.
+    """
+    return (registry or unit_registry.snapshot()).max_capacity.get(no_unit)
+
+# Forecasts: each unit's burn rate is the HM hours it runs per shift, fitted over its
+# most recent FORECAST_WINDOW records. Shifts are 12 hours, so the 12:00 estimate is
+# taken half a shift after the start.
+FORECAST_WINDOW = int(os.environ.get('FORECAST_WINDOW', 14))
+SHIFT_HOURS = 12
+FORECAST_COLUMNS = [
+    "samples", "burn_rate", "last_date", "last_shift", "last_hm", "next_hm", "est_hm_12",
+    "fuel_per_shift", "projected_buffer_stock", "shifts_to_empty", "hours_to_empty",
+]
+
+def compute_forecasts(df, window=FORECAST_WINDOW):
+    """
+    Fits the burn rate of every unit in df in one vectorized pass and projects its
+    next-shift HM and time-to-empty. The rate is the least-squares slope of HM_Akhir
+    against the shift number over the unit's last `window` records, so shifts without
+    an entry count as elapsed time; units with a single record use its Selisih.
+    Returns a DataFrame indexed by NO_UNIT with FORECAST_COLUMNS.
+    """
+    df = df[df['Date'].notna()]
+    if df.empty:
+        return pd.DataFrame(columns=FORECAST_COLUMNS, index=pd.Index([], name='NO_UNIT'))
+    tail = df.groupby('NO_UNIT', observed=True, sort=False).tail(window)
+    days = tail['Date'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+    x = (days * 2 + np.minimum(tail['shift_order'].to_numpy(), 2)).astype(np.float64)
+    x -= x.min()
+    y = tail['HM_Akhir'].to_numpy(dtype=np.float64)
+    sums = pd.DataFrame({
+        'NO_UNIT': tail['NO_UNIT'].to_numpy(dtype=object),
+        'n': 1.0, 'x': x, 'y': y, 'xx': x * x, 'xy': x * y,
+        'selisih': tail['Selisih'].to_numpy(dtype=np.float64),
+    }).groupby('NO_UNIT', sort=False).sum()
+    n = sums['n']
+    denominator = n * sums['xx'] - sums['x'] ** 2
+    slope = (n * sums['xy'] - sums['x'] * sums['y']) / denominator.where(denominator > 0)
+    burn_rate = slope.fillna(sums['selisih'] / n).clip(lower=0)
+
+    last = tail.drop_duplicates('NO_UNIT', keep='last')
+    last = last.set_index(last['NO_UNIT'].astype(object))
+    units = burn_rate.index
+    last_hm = last['HM_Akhir'].reindex(units).astype(np.float64)
+    # Unregistered units get NaN, so their projections stay empty instead of using a guess
+    registry = unit_registry.snapshot()
+    penjatahan = pd.Series([get_penjatahan(unit, registry) for unit in units], index=units, dtype=np.float64)
+    max_capacity = pd.Series([get_max_capacity(unit, registry) for unit in units], index=units, dtype=np.float64)
+    fuel_per_shift = burn_rate * penjatahan
+    shifts_to_empty = (max_capacity / fuel_per_shift.where(fuel_per_shift > 0)).where(max_capacity > 0)
+    forecasts = pd.DataFrame({
+        'samples': n.astype(int),
+        'burn_rate': burn_rate,
+        'last_date': last['Date'].reindex(units),
+        'last_shift': last['shift'].astype(object).reindex(units),
+        'last_hm': last_hm,
+        'next_hm': last_hm + burn_rate,
+        'est_hm_12': last_hm + burn_rate / 2,
+        'fuel_per_shift': fuel_per_shift,
+        'projected_buffer_stock': (max_capacity - fuel_per_shift).where(max_capacity > 0),
+        'shifts_to_empty': shifts_to_empty,
+        'hours_to_empty': shifts_to_empty * SHIFT_HOURS,
+    }, index=units)
+    forecasts.index.name = 'NO_UNIT'
+    return forecasts
+
+class ForecastCache:
+    """
+    Per-unit forecasts derived from the record cache's frame. The record cache reports
+    which units gained rows, and only those units are refitted on the next read; a
+    full refit happens after a reload or purge of the records, or when the unit
+    registry's version changes.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.stats = Counter()
+        self._lock = threading.RLock()
+        self._forecasts = None
+        self._dirty = set()
+        self._registry_version = None
+
+    def invalidate(self, units=None):
+        with self._lock:
+            if units is None:
+                self._forecasts = None
+                self._dirty.clear()
+            else:
+                self._dirty.update(units)
+
+    def get(self, df):
+        with self._lock:
+            registry_version = unit_registry.snapshot().version
+            if self._forecasts is None or registry_version != self._registry_version:
+                self._registry_version = registry_version
+                self.stats['full'] += 1
+                with timed('forecast'):
+                    self._forecasts = compute_forecasts(df, self.window)
+            elif self._dirty:
+                self.stats['incremental'] += 1
+                with timed('forecast'):
+                    refitted = compute_forecasts(df[df['NO_UNIT'].isin(self._dirty)], self.window)
+                    kept = self._forecasts.drop(index=list(self._dirty), errors='ignore')
+                    self._forecasts = pd.concat([kept, refitted]) if not kept.empty else refitted
+            self._dirty.clear()
+            return self._forecasts
+
+    def info(self):
+        with self._lock:
+            return {
+                **self.stats,
+                'units': 0 if self._forecasts is None else len(self._forecasts),
+                'pending_units': len(self._dirty),
+                'window': self.window,
+            }
+
+forecast_cache = ForecastCache(window=FORECAST_WINDOW)
+record_cache.subscribe(forecast_cache.invalidate)
+
+def get_forecasts():
+    """
+    Returns the per-unit forecast DataFrame for the current records (see compute_forecasts).
+    """
+    return forecast_cache.get(load_or_create_data())
+
+def forecast_rows(forecasts):
+    """
+    Converts forecasts to JSON-ready dicts, active units first, rounded to 2 decimals.
+    """
+    units = get_units()
+    order = [unit for unit in units if unit in forecasts.index]
+    order += sorted(unit for unit in forecasts.index if unit not in units)
+    if forecasts.empty:
+        # No records yet (fresh deploy or after a reset); last_date is not a datetime column then
+        return []
+    rows = forecasts.reindex(order)
+    rows = rows.assign(last_date=rows['last_date'].dt.strftime('%Y-%m-%d')).round(2).astype(object)
+    return rows.where(rows.notna(), None).reset_index().to_dict(orient='records')
+
+def get_report_forecasts(units):
+    """
+    Returns the forecasts of the given units for a report. A warm record cache serves
+    them from the forecast cache; otherwise only each unit's last FORECAST_WINDOW records
+    are fetched, so a report on a cold process still reads a bounded number of rows
+    instead of loading the whole history.
+    """
+    df = record_cache.get_if_loaded()
+    if df is not None:
+        return forecast_cache.get(df)
+    parts = run_concurrently(*[partial(fetch_latest_records, unit, FORECAST_WINDOW) for unit in units])
+    with timed('forecast'):
+        return compute_forecasts(build_records_df([record for part in parts for record in part]), FORECAST_WINDOW)
+
+def attach_forecasts(df):
+    """
+    Adds the per-row plan columns used by the PDF: Est_HM_12 (HM_Awal plus half a shift
+    at the unit's current burn rate) and Hours_To_Empty (from a full tank at that rate).
+    """
+    forecasts = get_report_forecasts(df['NO_UNIT'].astype(object).unique().tolist())
+    units = df['NO_UNIT'].astype(object)
+    burn_rate = units.map(forecasts['burn_rate']).astype(np.float64)
+    return df.assign(
+        Est_HM_12=df['HM_Awal'] + burn_rate.fillna(0) / 2,
+        Hours_To_Empty=units.map(forecasts['hours_to_empty']).astype(np.float64),
+    )
+
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+IMPORT_REQUIRED_COLUMNS = ["Date", "NO_UNIT", "HM_Akhir", "shift"]
+
+def read_import_file(file_storage):
+    """
+    Reads an uploaded CSV or XLSX file laid out like backup_fuel_data.csv.
+    Only Date, NO_UNIT, HM_Akhir and shift are used; the other columns are recomputed.
+    """
+    filename = (file_storage.filename or '').lower()
+    if filename.endswith('.xlsx'):
+        df = pd.read_excel(file_storage, engine='openpyxl', dtype={'NO_UNIT': str, 'shift': str})
+    elif filename.endswith('.csv'):
+        df = pd.read_csv(file_storage, dtype={'NO_UNIT': str, 'shift': str})
+    else:
+        raise ValueError("File harus berformat .csv atau .xlsx.")
+    missing = [col for col in IMPORT_REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Kolom wajib tidak ditemukan: {', '.join(missing)}.")
+    return df
+
+def prepare_import(raw_df):
+    """
+    Validates imported readings and computes the derived columns for the valid ones.
+
+    Rows are chained per unit in (Date, shift) order starting from the unit's latest
+    record in Supabase: each HM_Awal is the previous HM_Akhir and HM_Akhir must keep
+    increasing. Returns (records_to_insert, row_numbers, errors_df): row_numbers holds
+    the spreadsheet row of each record, and errors_df lists the spreadsheet row number
+    and the reason for every rejected row.
+    """
+    df = pd.DataFrame({
+        'Row': raw_df.index + 2, # +1 for the header row, +1 for 1-based rows
+        'Date': pd.to_datetime(raw_df['Date'], errors='coerce'),
+        'NO_UNIT': raw_df['NO_UNIT'].fillna('').astype(str).str.strip(),
+        'HM_Akhir': pd.to_numeric(raw_df['HM_Akhir'], errors='coerce').astype(float).round(2),
+        'shift': raw_df['shift'].fillna('').astype(str).str.strip(),
+    })
+    df['shift_order'] = df['shift'].map(SHIFT_ORDER)
+    df['Error'] = ''
+
+    def reject(mask, message):
+        df.loc[mask & (df['Error'] == ''), 'Error'] = message
+
+    reject(df['Date'].isna(), "Tanggal tidak valid")
+    registry = unit_registry.snapshot()
+    reject(~df['NO_UNIT'].isin(registry.units), "Unit tidak dikenal atau tidak aktif")
+    reject(df['shift_order'].isna(), "Shift harus 'Shift 1' atau 'Shift 2'")
+    reject(df['HM_Akhir'].isna(), "HM Akhir tidak valid")
+    reject(df.duplicated(['NO_UNIT', 'Date', 'shift'], keep='first'), "Duplikat unit, tanggal dan shift dalam file")
+
+    valid = df[df['Error'] == ''].sort_values(['NO_UNIT', 'Date', 'shift_order'], kind='stable')
+
+    # One targeted lookup per unit in the file for the starting HM and the last recorded (Date, shift)
+    latest_hm, latest_key = {}, {}
+    for unit in valid['NO_UNIT'].unique():
+        latest = get_latest_record(unit)
+        if latest and latest.get('HM_Akhir') is not None:
+            latest_hm[unit] = float(latest['HM_Akhir'])
+            latest_key[unit] = (pd.Timestamp(latest['Date']), SHIFT_ORDER.get(latest.get('shift'), 3))
+        else:
+            latest_hm[unit] = registry.initial_hm_awal.get(unit, 0.0)
+
+    # Units without records map to NaT, which compares False, so none of their rows are rejected here
+    last_date = pd.to_datetime(valid['NO_UNIT'].map({unit: key[0] for unit, key in latest_key.items()}))
+    last_order = valid['NO_UNIT'].map({unit: key[1] for unit, key in latest_key.items()})
+    not_after_latest = (valid['Date'] < last_date) | ((valid['Date'] == last_date) & (valid['shift_order'] <= last_order))
+    df.loc[not_after_latest[not_after_latest].index, 'Error'] = "Tidak setelah data terakhir unit ini"
+    valid = valid[~not_after_latest]
+
+    # Rejected rows never exceed the running maximum, so the running maximum of all previous
+    # rows equals the HM_Akhir of the previous accepted row, i.e. this row's HM_Awal
+    start_hm = valid['NO_UNIT'].map(latest_hm)
+    previous_max = valid.groupby('NO_UNIT', sort=False)['HM_Akhir'].transform(lambda hm: hm.cummax().shift(1))
+    hm_awal = np.maximum(previous_max.fillna(start_hm), start_hm)
+    not_increasing = valid['HM_Akhir'] <= hm_awal
+    df.loc[not_increasing[not_increasing].index, 'Error'] = "HM Akhir harus lebih besar dari HM Awal"
+    accepted = valid[~not_increasing]
+    hm_awal = hm_awal[~not_increasing]
+
+    selisih = (accepted['HM_Akhir'] - hm_awal).round(2)
+    accepted_units = accepted['NO_UNIT'].unique()
+    penjatahan = accepted['NO_UNIT'].map({unit: get_penjatahan(unit, registry) for unit in accepted_units}).astype(int)
+    max_capacity = accepted['NO_UNIT'].map({unit: get_max_capacity(unit, registry) for unit in accepted_units}).astype(float)
+    records_df = pd.DataFrame({
+        "Date": accepted['Date'].dt.strftime('%Y-%m-%d'),
+        "NO_UNIT": accepted['NO_UNIT'],
+        "HM_Awal": hm_awal.round(2),
+        "HM_Akhir": accepted['HM_Akhir'],
+        "Selisih": selisih,
+        "Literan": (selisih * penjatahan).round(2),
+        "Penjatahan": penjatahan,
+        "Max_Capacity": max_capacity.round(2),
+        "Buffer_Stock": (max_capacity - selisih * penjatahan).round(2),
+        "is_new": True,
+        "shift": accepted['shift'],
+    })
+    # Insert in chronological order so ids follow the (Date, shift) chain
+    records_df = records_df.assign(_order=accepted['shift_order']).sort_values(['Date', '_order'], kind='stable')
+    records = records_df.drop(columns=['_order']).to_dict(orient='records')
+    row_numbers = df.loc[records_df.index, 'Row'].tolist()
+
+    errors_df = df[df['Error'] != ''].sort_values('Row')
+    errors_df = errors_df.assign(Date=errors_df['Date'].dt.strftime('%Y-%m-%d'))[
+        ['Row', 'Date', 'NO_UNIT', 'shift', 'HM_Akhir', 'Error']
+    ]
+    return records, row_numbers, errors_df
+
+def insert_records(records, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Inserts records in batches and patches the record cache with the inserted rows.
+    """
+    inserted = []
+    try:
+        for start in range(0, len(records), batch_size):
+            response = supabase.table('fuel_records').insert(records[start:start + batch_size]).execute()
+            inserted.extend(response.data or [])
+    except Exception as e:
+        log_event('insert_records_failed', level=logging.ERROR, inserted=len(inserted), total=len(records), error=str(e))
+        raise
+    finally:
+        record_cache.add(*inserted)
+    return inserted
+
+INSERT_RECORD_RPC = 'insert_fuel_record'
+HM_NOT_INCREASING = 'HM_AKHIR_NOT_INCREASING'
+
+class HmNotIncreasing(Exception):
+    """Raised when a new HM_Akhir is not above the unit's latest HM_Akhir."""
+
+    def __init__(self, hm_awal):
+        super().__init__(hm_awal)
+        self.hm_awal = hm_awal
+
+class UnitLocks:
+    """
+    One lock per unit, created on first use. Entries for the same unit run one at a
+    time while other units proceed in parallel; the guard is only held to look up a lock.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def __call__(self, no_unit):
+        with self._guard:
+            lock = self._locks.get(no_unit)
+            if lock is None:
+                lock = self._locks[no_unit] = threading.Lock()
+            return lock
+
+unit_locks = UnitLocks()
+# None until the first entry tells whether the insert_fuel_record migration is applied
+_insert_rpc_available = None
+
+def _insert_record_rpc(record, initial_hm_awal):
+    # HM_Awal is read, validated and written inside one database transaction that
+    # holds a per-unit advisory lock, so it is atomic across every app instance
+    try:
+        response = supabase.rpc(INSERT_RECORD_RPC, {
+            'p_record': record, 'p_initial_hm_awal': initial_hm_awal,
+        }).execute()
+    except APIError as e:
+        if e.message == HM_NOT_INCREASING:
+            raise HmNotIncreasing(float(e.hint)) from e
+        raise
+    inserted = response.data[0] if isinstance(response.data, list) else response.data
+    record_cache.add(inserted)
+    return inserted
+
+def _insert_record_locked(record):
+    # Without the RPC the read-validate-insert runs under this process's lock for the
+    # unit; entries arriving through other instances are not serialized
+    with unit_locks(record['NO_UNIT']):
+        hm_awal = get_latest_hm(record['NO_UNIT'])
+        if record['HM_Akhir'] <= hm_awal:
+            raise HmNotIncreasing(hm_awal)
+        selisih = round(record['HM_Akhir'] - hm_awal, 2)
+        record = dict(
+            record,
+            HM_Awal=round(hm_awal, 2),
+            Selisih=selisih,
+            Literan=round(selisih * record['Penjatahan'], 2),
+            Buffer_Stock=round(record['Max_Capacity'] - (selisih * record['Penjatahan']), 2),
+        )
+        return insert_record(record)
+
+def insert_record_serialized(record, initial_hm_awal):
+    """
+    Inserts a new entry whose HM_Awal is the unit's latest HM_Akhir, computing
+    Selisih, Literan and Buffer_Stock from it. Concurrent entries for one unit are
+    serialized; raises HmNotIncreasing when HM_Akhir does not move forward.
+    """
+    global _insert_rpc_available
+    if _insert_rpc_available is not False:
+        try:
+            inserted = _insert_record_rpc(record, initial_hm_awal)
+            _insert_rpc_available = True
+            return inserted
+        except APIError as e:
+            if e.code != 'PGRST202':
+                raise
+            _insert_rpc_available = False
+            log_event('insert_rpc_missing', level=logging.WARNING, rpc=INSERT_RECORD_RPC)
+    return _insert_record_locked(record)
+
+INSERT_RECORDS_RPC = 'insert_fuel_records'
+IMPORT_STALE_ERROR = "Data unit berubah selama impor, tidak lagi setelah data terakhir unit ini"
+# None until the first import tells whether the insert_fuel_records migration is applied
+_import_rpc_available = None
+
+def _insert_records_rpc(records, initial_hm_awal, batch_size):
+    # Every batch is chained onto the units' latest stored rows under the same advisory
+    # locks as insert_fuel_record; rows a concurrent entry made stale are left out
+    inserted = []
+    try:
+        for start in range(0, len(records), batch_size):
+            response = supabase.rpc(INSERT_RECORDS_RPC, {
+                'p_records': records[start:start + batch_size], 'p_initial_hm_awal': initial_hm_awal,
+            }).execute()
+            inserted.extend(response.data or [])
+    except Exception as e:
+        if inserted:
+            log_event('insert_records_failed', level=logging.ERROR, inserted=len(inserted), total=len(records), error=str(e))
+        raise
+    finally:
+        record_cache.add(*inserted)
+    return inserted
+
+def reject_skipped(records, row_numbers, inserted, errors_df):
+    """
+    Adds the prepared records that are missing from inserted to errors_df.
+    """
+    stored = {(row['NO_UNIT'], str(row['Date'])[:10], row['shift']) for row in inserted}
+    skipped = [
+        {'Row': row, 'Date': record['Date'], 'NO_UNIT': record['NO_UNIT'], 'shift': record['shift'],
+         'HM_Akhir': record['HM_Akhir'], 'Error': IMPORT_STALE_ERROR}
+        for row, record in zip(row_numbers, records)
+        if (record['NO_UNIT'], record['Date'], record['shift']) not in stored
+    ]
+    if not skipped:
+        return errors_df
+    skipped_df = pd.DataFrame(skipped, columns=errors_df.columns)
+    if errors_df.empty:
+        return skipped_df
+    return pd.concat([errors_df, skipped_df], ignore_index=True).sort_values('Row', kind='stable')
+
+def import_records_serialized(raw_df, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validates an imported file and inserts its valid rows in batches, serialized per
+    unit against concurrent entries like insert_record_serialized: through the
+    insert_fuel_records RPC, or without it under this process's locks for every unit
+    in the file. Returns (inserted, errors_df).
+    """
+    global _import_rpc_available
+    if _import_rpc_available is not False:
+        with timed('import_prepare'):
+            records, row_numbers, errors_df = prepare_import(raw_df)
+        if not records:
+            return [], errors_df
+        registry = unit_registry.snapshot()
+        initial_hm_awal = {unit: registry.initial_hm_awal.get(unit, 0.0) for unit in {r['NO_UNIT'] for r in records}}
+        try:
+            inserted = _insert_records_rpc(records, initial_hm_awal, batch_size)
+            _import_rpc_available = True
+            return inserted, reject_skipped(records, row_numbers, inserted, errors_df)
+        except APIError as e:
+            if e.code != 'PGRST202':
+                raise
+            _import_rpc_available = False
+            log_event('insert_rpc_missing', level=logging.WARNING, rpc=INSERT_RECORDS_RPC)
+
+    # The file is validated against each unit's latest row and inserted while holding
+    # the units' locks, taken in order so two imports cannot deadlock
+    units = sorted(set(raw_df['NO_UNIT'].fillna('').astype(str).str.strip()))
+    with ExitStack() as stack:
+        for unit in units:
+            stack.enter_context(unit_locks(unit))
+        with timed('import_prepare'):
+            records, _, errors_df = prepare_import(raw_df)
+        return insert_records(records, batch_size), errors_df
+
+def add_new_record(no_unit, hm_akhir, date, shift):
+    registry = unit_registry.snapshot()
+    no_unit = no_unit.strip()
+    if no_unit not in registry.units:
+        return None, f"Unit {no_unit} tidak terdaftar atau tidak aktif."
+
+    new_record = {
+        "Date": date.strftime("%Y-%m-%d"),
+        "NO_UNIT": no_unit,
+        "HM_Akhir": round(hm_akhir, 2),
+        "Penjatahan": get_penjatahan(no_unit, registry),
+        "Max_Capacity": round(get_max_capacity(no_unit, registry), 2),
+        "is_new": True,
+        "shift": shift
+    }
+
+    # HM_Awal is read and checked under a per-unit lock, so two entries for the same
+    # unit can no longer both chain onto the same previous HM_Akhir
+    try:
+        inserted = insert_record_serialized(new_record, registry.initial_hm_awal.get(no_unit, 0.0))
+    except HmNotIncreasing as e:
+        return None, f"HM Akhir ({hm_akhir}) harus lebih besar dari HM Awal ({e.hm_awal})!"
+    return inserted, None
+
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', SUPABASE_PAGE_SIZE))
+EXPORT_FORMATS = {
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('csv', 'text/csv'),
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+}
+
+# Export order; id is unique and never null, so it makes the order total for keyset paging
+EXPORT_ORDER = ('Date', 'shift', 'id')
+
+def postgrest_value(value):
+    # Double quotes keep reserved characters (, . : ( ) and spaces) inside one filter value
+    if isinstance(value, (int, float)):
+        return str(value)
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def keyset_after(row, columns):
+    """
+    Builds a PostgREST or= filter matching the rows that come after row in ascending
+    order of columns (nulls last, as Postgres sorts them). The last column must be
+    unique and not null.
+    """
+    def after(column):
+        value = row.get(column)
+        if value is None:
+            return []
+        return [f"{column}.gt.{postgrest_value(value)}"] + ([] if column == columns[-1] else [f"{column}.is.null"])
+
+    def equal(column):
+        value = row.get(column)
+        return f"{column}.is.null" if value is None else f"{column}.eq.{postgrest_value(value)}"
+
+    branches = []
+    for i, column in enumerate(columns):
+        greater = after(column)
+        if not greater:
+            continue
+        condition = greater[0] if len(greater) == 1 else f"or({','.join(greater)})"
+        prefix = [equal(previous) for previous in columns[:i]]
+        branches.append(f"and({','.join(prefix + [condition])})" if prefix else condition)
+    return ','.join(branches)
+
+def iter_record_chunks(no_unit=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields lists of raw records in chronological order, one Supabase page at a time,
+    so exports never hold more than chunk_size rows in memory. Pages are keyset-paged
+    on (Date, shift, id), so each one is an index range scan instead of an OFFSET that
+    rereads every earlier row. With the record mirror the chunks are sliced from its
+    synced Arrow table instead.
+    """
+    mirror = record_mirror.table()
+    if mirror is not None:
+        if no_unit is not None:
+            mirror = mirror.filter(pc.equal(mirror['NO_UNIT'], no_unit))
+        ordered = mirror.sort_by([('Date', 'ascending'), ('shift', 'ascending'), ('id', 'ascending')])
+        for batch in ordered.select(RECORD_COLUMNS).to_batches(max_chunksize=chunk_size):
+            yield batch.to_pylist()
+        return
+
+    def fetch(last):
+        query = supabase.table('fuel_records').select(','.join(['id'] + RECORD_COLUMNS))
+        if no_unit is not None:
+            query = query.eq('NO_UNIT', no_unit)
+        if last is not None:
+            query = query.or_(keyset_after(last, EXPORT_ORDER))
+        return (
+            query.order('Date').order('shift').order('id')
+            .limit(chunk_size)
+            .execute().data or []
+        )
+
+    # The next page is requested on the database pool while the caller writes this one
+    pending = db_submit(partial(fetch, None))
+    while True:
+        batch = pending.result()
+        if len(batch) == chunk_size:
+            pending = db_submit(partial(fetch, batch[-1]))
+        if batch:
+            yield batch
+        if len(batch) < chunk_size:
+            return
+
+def export_row(record):
+    """
+    Returns a record's RECORD_COLUMNS values the way every export format writes them.
+    Whole-number floats become integers, as they arrive in Supabase's JSON, so an
+    export read from the record mirror (whose HM columns are doubles) is identical to
+    one read from Supabase.
+    """
+    return [
+        int(value) if isinstance(value, float) and value.is_integer() else value
+        for value in (record.get(col) for col in RECORD_COLUMNS)
+    ]
+
+def write_records_xlsx(chunks, fileobj):
+    """
+    Writes record chunks into an .xlsx file using openpyxl's write-only mode,
+    which flushes rows to disk instead of building the worksheet in memory.
+    """
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(RECORD_COLUMNS)
+    for chunk in chunks:
+        for record in chunk:
+            sheet.append(export_row(record))
+    workbook.save(fileobj)
+
+def iter_records_csv(chunks):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(RECORD_COLUMNS)
+    for chunk in chunks:
+        writer.writerows(export_row(record) for record in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+def iter_records_ndjson(chunks):
+    for chunk in chunks:
+        yield ''.join(json.dumps(dict(zip(RECORD_COLUMNS, export_row(record)))) + '\n' for record in chunk)
+
+def write_export(no_unit, export_format, fileobj):
+    """
+    Writes the export of all records or a single unit into a binary file object.
+    """
+    chunks = iter_record_chunks(no_unit)
+    if export_format == 'xlsx':
+        with timed('xlsx_write'):
+            write_records_xlsx(chunks, fileobj)
+        return
+    body = iter_records_csv(chunks) if export_format == 'csv' else iter_records_ndjson(chunks)
+    for text in body:
+        fileobj.write(text.encode('utf-8'))
+
+def export_records_response(no_unit, download_name, export_format):
+    """
+    Builds the export response for all records or a single unit.
+    The xlsx workbook is spooled to a temporary file; csv and ndjson stream row chunks directly.
+    """
+    extension, mimetype = EXPORT_FORMATS[export_format]
+    if export_format == 'xlsx':
+        output = tempfile.TemporaryFile()
+        write_export(no_unit, export_format, output)
+        output.seek(0)
+        return send_file(output, mimetype=mimetype, download_name=f'{download_name}.{extension}', as_attachment=True)
+
+    chunks = iter_record_chunks(no_unit)
+    body = iter_records_csv(chunks) if export_format == 'csv' else iter_records_ndjson(chunks)
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={download_name}.{extension}'}
+    )
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 200
+
+def parse_record_filters(args):
+    """
+    Reads the history table's filter and paging parameters from the query string.
+    Invalid values fall back to defaults instead of failing the page.
+    """
+    def parse_date(value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d') if value else None
+        except ValueError:
+            return None
+
+    def parse_int(value, default):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    return {
+        'filter_unit': args.get('filter_unit', 'Semua') or 'Semua',
+        'date_from': parse_date(args.get('date_from')),
+        'date_to': parse_date(args.get('date_to')),
+        'page': max(parse_int(args.get('page'), 1), 1),
+        'page_size': min(max(parse_int(args.get('page_size'), DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE),
+    }
+
+def get_records_page(df, filter_unit='Semua', date_from=None, date_to=None, page=1, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Filters the sorted records and returns only the requested page, ready for rendering.
+    Only the rows of that page are converted to dicts.
+    """
+    with timed('page_filter'):
+        return _get_records_page(df, filter_unit, date_from, date_to, page, page_size)
+
+def _get_records_page(df, filter_unit, date_from, date_to, page, page_size):
+    mask = pd.Series(True, index=df.index)
+    if filter_unit != 'Semua':
+        mask &= df["NO_UNIT"] == filter_unit
+    if date_from is not None:
+        mask &= df["Date"] >= date_from
+    if date_to is not None:
+        mask &= df["Date"] <= date_to
+    filtered_df = df[mask] if not mask.all() else df
+
+    total = len(filtered_df)
+    pages = max((total + page_size - 1) // page_size, 1)
+    page = min(page, pages)
+    page_df = filtered_df.iloc[(page - 1) * page_size:page * page_size]
+    # float32 columns are widened and rounded so the page shows 672.6 rather than 672.5999755859375
+    page_df = page_df.drop(columns=['shift_order']).astype({col: np.float64 for col in FLOAT32_COLUMNS}).round(2)
+    rows = page_df.assign(Date=page_df['Date'].dt.strftime('%Y-%m-%d')).to_dict(orient='records')
+    return {
+        'rows': rows,
+        'total': total,
+        'page': page,
+        'pages': pages,
+        'page_size': page_size,
+    }
+
+# Analytics are served from the fuel_rollup_shift / fuel_rollup_week tables, which a
+# trigger on fuel_records keeps current (see supabase/migrations). Only the handful of
+# rollup rows inside the requested window are read, never the full history.
+ANALYTICS_PERIODS = ('shift', 'day', 'week')
+ANALYTICS_DEFAULT_DAYS = 30
+ANALYTICS_MAX_DAYS = int(os.environ.get('ANALYTICS_MAX_DAYS', 366))
+ROLLUP_COLUMNS = ["record_count", "total_literan", "total_selisih", "total_buffer_stock", "min_buffer_stock"]
+
+def parse_analytics_params(args):
+    """
+    Reads period, unit and date window for /api/analytics, clamping the window to
+    ANALYTICS_MAX_DAYS. Returns (params, error_message).
+    """
+    period = args.get('period', 'day')
+    if period not in ANALYTICS_PERIODS:
+        return None, f"Periode tidak valid. Pilih salah satu dari: {', '.join(ANALYTICS_PERIODS)}."
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        date_to = datetime.strptime(args['date_to'], '%Y-%m-%d') if args.get('date_to') else today
+        date_from = (datetime.strptime(args['date_from'], '%Y-%m-%d') if args.get('date_from')
+                     else date_to - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1))
+    except ValueError:
+        return None, 'Format tanggal tidak valid.'
+    if date_from > date_to:
+        return None, 'Tanggal awal harus sebelum tanggal akhir.'
+    if (date_to - date_from).days + 1 > ANALYTICS_MAX_DAYS:
+        return None, f'Rentang analitik maksimal {ANALYTICS_MAX_DAYS} hari.'
+    unit = args.get('unit', 'Semua') or 'Semua'
+    return {'period': period, 'date_from': date_from, 'date_to': date_to,
+            'no_unit': None if unit == 'Semua' else unit}, None
+
+def fetch_rollups(period, date_from, date_to, no_unit=None):
+    """
+    Reads rollup rows for the window from Supabase: the per-shift table for the
+    shift/day periods and the ISO-week table for week (weeks overlapping the window).
+    """
+    if period == 'week':
+        table, date_column = 'fuel_rollup_week', 'week_start'
+        date_from = date_from - timedelta(days=date_from.weekday())
+    else:
+        table, date_column = 'fuel_rollup_shift', 'Date'
+    rows = []
+    while True:
+        query = (supabase.table(table).select('*')
+                 .gte(date_column, date_from.strftime('%Y-%m-%d'))
+                 .lte(date_column, date_to.strftime('%Y-%m-%d')))
+        if no_unit is not None:
+            query = query.eq('NO_UNIT', no_unit)
+        batch = (query.order(date_column).order('NO_UNIT')
+                 .range(len(rows), len(rows) + SUPABASE_PAGE_SIZE - 1).execute().data or [])
+        rows.extend(batch)
+        if len(batch) < SUPABASE_PAGE_SIZE:
+            return rows
+
+def compute_rollups(df, period, date_from, date_to, no_unit=None):
+    """
+    Builds the same rollup rows from the cached records, used while the rollup
+    migration has not been applied yet. Only the rows of the window are grouped.
+    """
+    if period == 'week':
+        date_from = date_from - timedelta(days=date_from.weekday())
+        date_to = date_to + timedelta(days=6 - date_to.weekday())
+    mask = (df['Date'] >= date_from) & (df['Date'] <= date_to)
+    if no_unit is not None:
+        mask &= df['NO_UNIT'] == no_unit
+    window = df.loc[mask, ['NO_UNIT', 'Date', 'shift', 'Literan', 'Selisih', 'Buffer_Stock']]
+    if period == 'week':
+        keys = ['NO_UNIT', 'week_start']
+        window = window.assign(week_start=window['Date'] - pd.to_timedelta(window['Date'].dt.weekday, unit='D'))
+    else:
+        keys = ['NO_UNIT', 'Date', 'shift']
+    grouped = window.astype({col: np.float64 for col in ['Literan', 'Selisih', 'Buffer_Stock']}).groupby(keys, observed=True)
+    rollups = grouped.agg(
+        record_count=('Literan', 'size'),
+        total_literan=('Literan', 'sum'),
+        total_selisih=('Selisih', 'sum'),
+        total_buffer_stock=('Buffer_Stock', 'sum'),
+        min_buffer_stock=('Buffer_Stock', 'min'),
+    ).reset_index()
+    date_column = keys[1]
+    rollups[date_column] = rollups[date_column].dt.strftime('%Y-%m-%d')
+    return rollups.astype({'NO_UNIT': str}).to_dict(orient='records')
+
+def summarize_rollups(rows, period):
+    """
+    Turns rollup rows into per-unit, per-period figures. Per-shift rows are summed
+    into days for the day period; averages are derived from totals and counts.
+    """
+    if period == 'week':
+        keys = ['NO_UNIT', 'week_start']
+    elif period == 'day':
+        keys = ['NO_UNIT', 'Date']
+    else:
+        keys = ['NO_UNIT', 'Date', 'shift']
+    if not rows:
+        return []
+    rollups = pd.DataFrame(rows, columns=keys + ROLLUP_COLUMNS + (['shift'] if period == 'day' else []))
+    rollups = rollups.astype({col: np.float64 for col in ROLLUP_COLUMNS})
+    if period == 'day':
+        rollups = rollups.groupby(keys, as_index=False).agg(
+            record_count=('record_count', 'sum'),
+            total_literan=('total_literan', 'sum'),
+            total_selisih=('total_selisih', 'sum'),
+            total_buffer_stock=('total_buffer_stock', 'sum'),
+            min_buffer_stock=('min_buffer_stock', 'min'),
+        )
+    summary = pd.DataFrame({
+        'period': rollups[keys[1]],
+        'NO_UNIT': rollups['NO_UNIT'],
+        'records': rollups['record_count'].astype(int),
+        'total_literan': rollups['total_literan'],
+        'avg_selisih': rollups['total_selisih'] / rollups['record_count'],
+        'avg_buffer_stock': rollups['total_buffer_stock'] / rollups['record_count'],
+        'min_buffer_stock': rollups['min_buffer_stock'],
+    })
+    if period == 'shift':
+        summary.insert(1, 'shift', rollups['shift'])
+    summary = summary.sort_values(['period'] + (['shift'] if period == 'shift' else []) + ['NO_UNIT'], kind='stable')
+    summary = summary.round(2).astype(object)
+    return summary.where(summary.notna(), None).to_dict(orient='records')
+
+def get_analytics(period, date_from, date_to, no_unit=None):
+    """
+    Returns the analytics payload for /api/analytics. Falls back to grouping the cached
+    records of the window when the rollup tables do not exist in this database.
+    """
+    source = 'rollup'
+    try:
+        with timed('rollup_fetch'):
+            rows = fetch_rollups(period, date_from, date_to, no_unit)
+    except APIError as e:
+        if e.code not in MISSING_TABLE_CODES:
+            raise
+        log_event('rollup_tables_missing', level=logging.WARNING, error=e.message)
+        source = 'records'
+        with timed('rollup_compute'):
+            rows = compute_rollups(load_or_create_data(), period, date_from, date_to, no_unit)
+    return {
+        'period': period,
+        'date_from': date_from.strftime('%Y-%m-%d'),
+        'date_to': date_to.strftime('%Y-%m-%d'),
+        'unit': no_unit or 'Semua',
+        'source': source,
+        'rows': summarize_rollups(rows, period),
+    }
+
+PDF_HEADER = ["Date", "Unit", "Shift", "Est HM Jam 12:00", "HM", "Qty Plan Refueling", "Note"]
+PDF_COL_WIDTHS = [80, 60, 60, 100, 60, 100, 100]
+
+@lru_cache(maxsize=None)
+def get_pdf_styles():
+    """
+    Returns (paragraph styles, table style). They are immutable once built, so they are
+    shared by every render; ReportLab is first imported here, by the first report.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+
+    return getSampleStyleSheet(), TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.goldenrod),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('LEFTPADDING', (0, 0), (-1, -1), 5),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 5),
+    ])
+
+def build_pdf_rows(df):
+    """
+    Builds the report table rows column-wise instead of iterating row by row.
+    When attach_forecasts has run, Est HM shows the projected 12:00 reading and the
+    note the unit's projected hours to empty; otherwise they fall back to HM_Awal and blank.
+    """
+    literan = df['Literan'].to_numpy(dtype=float)
+    buffer_stock = df['Buffer_Stock'].to_numpy(dtype=float)
+    qty_plan = np.where(
+        literan > 0,
+        np.char.mod('%.2f', literan),
+        np.where(buffer_stock <= 0, 'Full', '-')
+    ).tolist()
+    dates = df['Date'].dt.strftime('%Y-%m-%d').fillna('')
+    est_hm = np.char.mod('%.2f', df.get('Est_HM_12', df['HM_Awal']).to_numpy(dtype=float)).tolist()
+    selisih = np.char.mod('%.2f', df['Selisih'].to_numpy(dtype=float)).tolist()
+    if 'Hours_To_Empty' in df.columns:
+        hours_to_empty = df['Hours_To_Empty'].to_numpy(dtype=float)
+        notes = np.where(
+            np.isfinite(hours_to_empty),
+            np.char.add('Habis ±', np.char.add(np.char.mod('%.0f', np.nan_to_num(hours_to_empty)), ' jam')),
+            ''
+        ).tolist()
+    else:
+        notes = [''] * len(df)
+    return [
+        list(row) for row in zip(dates, df['NO_UNIT'], df['shift'], est_hm, selisih, qty_plan, notes)
+    ]
+
+MAX_REPORT_DAYS = int(os.environ.get('MAX_REPORT_DAYS', 62))
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', os.cpu_count() or 1))
+PDF_SUMMARY_HEADER = ["Unit", "Records", "Total HM", "Total Literan", "Min Buffer Stock"]
+
+def get_shift_display(shift):
+    return (
+        "Shift 1 (06:00–18:00 WITA)" if shift == "Shift 1" else
+        "Shift 2 (18:00–06:00 WITA)" if shift == "Shift 2" else
+        "Shift 1 & 2 (All Day)"
+    )
+
+def build_report_section(df, shift, date):
+    """
+    Returns the flowables of one day's report: title plus the refueling plan table.
+    """
+    from reportlab.platypus import Paragraph, Table
+
+    styles, table_style = get_pdf_styles()
+    title = Paragraph(
+        f"PLAN REFUELING UNIT TRACK {date.strftime('%b %Y').upper()}"
+        f"<br/>{get_shift_display(shift)} Tgl: {date.strftime('%d %b %Y')}",
+        styles['Title']
+    )
+    table = Table([PDF_HEADER] + build_pdf_rows(df), colWidths=PDF_COL_WIDTHS)
+    table.setStyle(table_style)
+    return [title, Paragraph("<br/>", styles['Normal']), table]
+
+def build_summary_section(df, shift, date_from, date_to):
+    """
+    Returns the flowables of the fleet summary page for a date range.
+    """
+    from reportlab.platypus import Paragraph, Table
+
+    styles, table_style = get_pdf_styles()
+    summary = df.groupby('NO_UNIT', sort=True, observed=True).agg(
+        records=('HM_Akhir', 'size'),
+        selisih=('Selisih', 'sum'),
+        literan=('Literan', 'sum'),
+        buffer_min=('Buffer_Stock', 'min'),
+    )
+    rows = [
+        [unit, str(records), f"{selisih:.2f}", f"{literan:.2f}", f"{buffer_min:.2f}"]
+        for unit, records, selisih, literan, buffer_min in summary.itertuples()
+    ]
+    rows.append([
+        "Total", str(len(df)), f"{df['Selisih'].sum():.2f}", f"{df['Literan'].sum():.2f}",
+        f"{df['Buffer_Stock'].min():.2f}" if not df.empty else "-"
+    ])
+    title = Paragraph(
+        f"RINGKASAN REFUELING ARMADA<br/>{get_shift_display(shift)} "
+        f"Tgl: {date_from.strftime('%d %b %Y')} - {date_to.strftime('%d %b %Y')}",
+        styles['Title']
+    )
+    table = Table([PDF_SUMMARY_HEADER] + rows, colWidths=[80, 60, 100, 100, 100])
+    table.setStyle(table_style)
+    return [title, Paragraph("<br/>", styles['Normal']), table]
+
+def create_pdf_report(df, shift, date):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    with timed('pdf_render'):
+        doc.build(build_report_section(df, shift, date))
+    buffer.seek(0)
+    return buffer
+
+def split_by_day(df):
+    """
+    Splits a sorted range frame into (date, day_df) pairs in chronological order.
+    """
+    return [(day.to_pydatetime(), day_df) for day, day_df in df.groupby('Date', sort=True)]
+
+def create_range_pdf_report(df, shift, date_from, date_to):
+    """
+    Renders one combined PDF: a fleet summary page followed by one section per day.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import PageBreak, SimpleDocTemplate
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = build_summary_section(df, shift, date_from, date_to)
+    for day, day_df in split_by_day(df):
+        elements.append(PageBreak())
+        elements.extend(build_report_section(day_df, shift, day))
+    with timed('pdf_render'):
+        doc.build(elements)
+    buffer.seek(0)
+    return buffer
+
+def _render_report_bytes(day_df, shift, day):
+    # Top-level so it can be pickled into the process pool
+    return create_pdf_report(day_df, shift, day).getvalue()
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def get_pdf_pool():
+    """
+    Returns the process pool that renders range reports, created on first use and kept
+    for the life of the process. Workers are spawned, not forked: by the time a range
+    report is requested this process runs db_executor threads, and a forked child could
+    inherit a lock (metrics, caches) one of them held and deadlock on it.
+    """
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pdf_pool
+
+def discard_pdf_pool(pool):
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def render_day_reports(days, shift):
+    """
+    Renders the per-day reports of a range, reusing cached reports and spreading
+    the cache misses over the shared process pool since ReportLab rendering is
+    CPU-bound. Falls back to rendering in-process where worker processes are unavailable.
+    """
+    reports = {}
+    missing = []
+    for day, day_df in days:
+        key = get_report_key(day_df, shift, day)
+        pdf_bytes = report_cache.get(key)
+        if pdf_bytes is None:
+            missing.append((key, day, day_df))
+        else:
+            reports[day] = pdf_bytes
+
+    rendered = None
+    if len(missing) > 1 and PDF_WORKERS > 1:
+        pool = None
+        try:
+            pool = get_pdf_pool()
+            rendered = list(pool.map(
+                _render_report_bytes,
+                [day_df for _, _, day_df in missing],
+                [shift] * len(missing),
+                [day for _, day, _ in missing],
+            ))
+        except (OSError, NotImplementedError, BrokenProcessPool) as e:
+            log_event('pdf_pool_unavailable', level=logging.WARNING, error=str(e))
+            if pool is not None:
+                discard_pdf_pool(pool)
+    if rendered is None:
+        rendered = [_render_report_bytes(day_df, shift, day) for _, day, day_df in missing]
+
+    for (key, day, _), pdf_bytes in zip(missing, rendered):
+        report_cache.put(key, pdf_bytes)
+        reports[day] = pdf_bytes
+    return [(day, reports[day]) for day, _ in days]
+
+def create_range_zip_report(df, shift, shift_display):
+    """
+    Bundles one PDF per day of the range into a ZIP archive, named like the single-day downloads.
+    """
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for day, pdf_bytes in render_day_reports(split_by_day(df), shift):
+            archive.writestr(f"Plan_Refueling_Hauler_{day.strftime('%d_%b_%Y')}_{shift_display}.pdf", pdf_bytes)
+    buffer.seek(0)
+    return buffer
+
+class ReportCache:
+    """
+    LRU cache of rendered PDF reports, bounded by the total size of the cached files.
+    Keys include a version of the underlying rows, so a new record for that day
+    simply produces a new key and the stale report ages out.
+    """
 
-# Initialize Flask-Login
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._reports = OrderedDict()
+        self._size = 0
 
-# Initialize Supabase client
-SUPABASE_URL = os.environ.get('SUPABASE_URL')
-SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
-if not SUPABASE_URL or not SUPABASE_KEY:
-    logger.error("SUPABASE_URL or SUPABASE_KEY environment variable is not set")
-    raise ValueError("SUPABASE_URL or SUPABASE_KEY environment variable is not set.")
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    logger.info(f"Connected to Supabase at {SUPABASE_URL}")
-except Exception as e:
-    logger.error(f"Failed to initialize Supabase client: {str(e)}")
-    raise RuntimeError(f"Failed to initialize Supabase client: {str(e)}")
+    def get(self, key):
+        with self._lock:
+            pdf_bytes = self._reports.get(key)
+            if pdf_bytes is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            self._reports.move_to_end(key)
+            return pdf_bytes
 
-# User model for Flask-Login
-class User(UserMixin):
-    def __init__(self, id, username, role):
-        self.id = id
-        self.username = username
-        self.role = role
+    def put(self, key, pdf_bytes):
+        if len(pdf_bytes) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._reports:
+                self._size -= len(self._reports.pop(key))
+            self._reports[key] = pdf_bytes
+            self._size += len(pdf_bytes)
+            while self._size > self.max_bytes:
+                _, evicted = self._reports.popitem(last=False)
+                self._size -= len(evicted)
+                self.stats['evictions'] += 1
 
-@login_manager.user_loader
-def load_user(user_id):
-    try:
-        response = supabase.table('users').select('*').eq('id', user_id).execute()
-        if response.data:
-            user_data = response.data[0]
-            return User(user_data['id'], user_data['username'], user_data['role'])
-        return None
-    except Exception as e:
-        logger.error(f"Error loading user: {str(e)}")
-        return None
+    def purge(self):
+        with self._lock:
+            self._reports.clear()
+            self._size = 0
 
-LOCKED_UNITS = [
-    "DZ3007", "DZ3014", "DZ3026", "EX1022", "EX2017", "EX2027", "EX2032", "EX2033", "EX2040", "EX3009"
-]
-PENJATAHAN_MAP = {
-    "DZ3007": 52, "DZ3014": 52, "DZ3026": 52,
-    "EX1022": 58,
-    "EX2017": 93, "EX2027": 93, "EX2032": 93, "EX2033": 93, "EX2040": 93,
-    "EX3009": 126
-}
-MAX_CAPACITY_MAP = {
-    "DZ3007": 1000, "DZ3014": 1000, "DZ3026": 1200,
-    "EX1022": 980,
-    "EX2017": 1380, "EX2027": 1380, "EX2032": 1380, "EX2033": 1380, "EX2040": 1380,
-    "EX3009": 3400
-}
-INITIAL_HM_Awal = {
-    "DZ3007": 45645, "DZ3014": 46203, "DZ3026": 20629,
-    "EX1022": 34750,
-    "EX2017": 46115, "EX2027": 35466, "EX2032": 27140, "EX2033": 26280, "EX2040": 19070,
-    "EX3009": 36002
-}
+    def info(self):
+        with self._lock:
+            return {**self.stats, 'reports': len(self._reports), 'bytes': self._size, 'max_bytes': self.max_bytes}
 
-# Custom strftime filter
-def format_datetime(value, format='%Y-%m-%d'):
-    if value == 'now':
-        return datetime.now().strftime(format)
-    # Ensure value is a datetime object before formatting
-    if isinstance(value, datetime):
-        return value.strftime(format)
-    return str(value) # Fallback to string conversion if not datetime
+report_cache = ReportCache(max_bytes=int(os.environ.get('PDF_CACHE_MAX_BYTES', 32 * 1024 * 1024)))
 
-app.jinja_env.filters['strftime'] = format_datetime
+def get_report_key(df, shift, date):
+    version = (len(df), int(df['id'].max()) if 'id' in df.columns and not df.empty else None)
+    if 'Est_HM_12' in df.columns:
+        # Forecast columns move with new records of other days, so they are part of the version
+        version += (int(pd.util.hash_pandas_object(df[['Est_HM_12', 'Hours_To_Empty']], index=False).sum()),)
+    return (date.strftime('%Y-%m-%d'), shift, version)
 
-# Helper functions
-def load_or_create_data():
+def get_pdf_report(df, shift, date):
     """
-    Loads fuel records from Supabase, processes them into a Pandas DataFrame,
-    and ensures the DataFrame is sorted chronologically by Date and Shift.
+    Returns the report as a BytesIO, rendering it only if this exact version of the
+    day's rows has not been rendered before.
     """
-    try:
-        response = supabase.table('fuel_records').select('*').execute()
-        records = response.data
-        if records:
-            # Load records directly into DataFrame
-            df = pd.DataFrame(records)
-
-            # Ensure all required columns exist, adding them if missing
-            required_cols = [
-                "Date", "NO_UNIT", "HM_Awal", "HM_Akhir", "Selisih",
-                "Literan", "Penjatahan", "Max_Capacity", "Buffer_Stock", "is_new", "shift"
-            ]
-            for col in required_cols:
-                if col not in df.columns:
-                    df[col] = None # Add missing columns with None
-
-            # Convert column types and clean data
-            # errors='coerce' will turn unparseable dates into NaT (Not a Time)
-            df["Date"] = pd.to_datetime(df["Date"], errors='coerce') 
-            df["NO_UNIT"] = df["NO_UNIT"].astype(str).str.strip()
-            df["HM_Awal"] = df["HM_Awal"].astype(float).round(2)
-            df["HM_Akhir"] = df["HM_Akhir"].astype(float).round(2)
-            df["Selisih"] = df["Selisih"].astype(float).round(2)
-            df["Literan"] = df["Literan"].astype(float).round(2)
-            df["Penjatahan"] = df["Penjatahan"].astype(int)
-            df["Max_Capacity"] = df["Max_Capacity"].astype(float).round(2)
-            df["Buffer_Stock"] = df["Buffer_Stock"].astype(float).round(2)
-            df["is_new"] = df["is_new"].astype(bool)
-            # Ensure 'shift' is string and handle potential 'nan' values by replacing them with empty string
-            df["shift"] = df["shift"].astype(str).str.strip().replace('nan', '')
-
-            # Create a temporary 'shift_order' column for correct chronological sorting
-            # 'Shift 1' gets 1, 'Shift 2' gets 2, any other values get 3 (placing them last)
-            df['shift_order'] = df['shift'].map({'Shift 1': 1, 'Shift 2': 2}).fillna(3)
-
-            # Sort the DataFrame by Date (ascending) then by shift_order (ascending)
-            df = df.sort_values(by=['Date', 'shift_order'], ascending=[True, True])
-            
-            # Drop the temporary 'shift_order' column as it's no longer needed
-            df = df.drop(columns=['shift_order'])
-
-            return df
-        
-        # If no records are found in Supabase, return an empty DataFrame with correct columns
-        columns = [
-            "Date", "NO_UNIT", "HM_Awal", "HM_Akhir", "Selisih",
-            "Literan", "Penjatahan", "Max_Capacity", "Buffer_Stock", "is_new", "shift"
-        ]
-        return pd.DataFrame(columns=columns)
-    except Exception as e:
-        logger.error(f"Error loading data from Supabase: {str(e)}")
-        # Re-raise the exception or return an empty DataFrame with appropriate columns on error
-        # Returning an empty DataFrame might prevent a full app crash
-        return pd.DataFrame(columns=required_cols if 'required_cols' in locals() else [])
+    key = get_report_key(df, shift, date)
+    pdf_bytes = report_cache.get(key)
+    if pdf_bytes is None:
+        pdf_bytes = create_pdf_report(df, shift, date).getvalue()
+        report_cache.put(key, pdf_bytes)
+    return BytesIO(pdf_bytes)
 
-def save_data(df):
-    """
-    Saves the DataFrame back to Supabase. This function clears all existing records
-    and then inserts all records from the DataFrame.
-    """
-    try:
-        # Delete all existing records in Supabase (as per original logic)
-        supabase.table('fuel_records').delete().gte('id', 0).execute()
-        
-        records_to_insert = []
-        for _, row in df.iterrows():
-            record = {
-                # Convert datetime objects in 'Date' column back to string for Supabase
-                "Date": row["Date"].strftime("%Y-%m-%d") if pd.notna(row["Date"]) else None,
-                "NO_UNIT": str(row["NO_UNIT"]).strip(),
-                "HM_Awal": float(row["HM_Awal"]),
-                "HM_Akhir": float(row["HM_Akhir"]),
-                "Selisih": float(row["Selisih"]),
-                "Literan": float(row["Literan"]),
-                "Penjatahan": int(row["Penjatahan"]),
-                "Max_Capacity": float(row["Max_Capacity"]),
-                "Buffer_Stock": float(row["Buffer_Stock"]),
-                "is_new": bool(row["is_new"]),
-                "shift": str(row.get("shift", "")).strip()
-            }
-            records_to_insert.append(record)
-        
-        # Perform a batch insert if there are records to insert
-        if records_to_insert:
-            supabase.table('fuel_records').insert(records_to_insert).execute()
-    except Exception as e:
-        logger.error(f"Error saving data to Supabase: {str(e)}")
-        raise
+# Background jobs are opt-in: set JOB_DIR on a long-running deployment whose instances
+# share it. On serverless hosts (Vercel) a frozen instance does no work after the 202 is
+# sent, and a status poll can reach an instance with a different /tmp, so they stay off.
+JOB_DIR = os.environ.get('JOB_DIR')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_ARTIFACT_TTL = float(os.environ.get('JOB_ARTIFACT_TTL', 3600))
+JOB_CACHE_MAX_BYTES = int(os.environ.get('JOB_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Queued or running jobs older than this are treated as lost (e.g. the process was restarted)
+JOB_TIMEOUT = float(os.environ.get('JOB_TIMEOUT', 900))
 
-def reset_data():
-    try:
-        supabase.table('fuel_records').delete().gte('id', 0).execute()
-    except Exception as e:
-        logger.error(f"Error resetting data in Supabase: {str(e)}")
-        raise
+class JobFailed(Exception):
+    """Raised by a job builder with a message that is shown to the user as is."""
 
-def backup_data():
-    df = load_or_create_data()
-    if not df.empty:
-        df.to_csv("backup_fuel_data.csv", index=False)
+def build_export_job(params, fileobj):
+    extension, mimetype = EXPORT_FORMATS[params['format']]
+    name = f"fuel_data_{params['unit']}" if params.get('unit') else 'fuel_data_all'
+    write_export(params.get('unit'), params['format'], fileobj)
+    return f'{name}.{extension}', mimetype
+
+def build_pdf_job(params, fileobj):
+    report_date = datetime.strptime(params['report_date'], '%Y-%m-%d')
+    report_date_end = datetime.strptime(params['report_date_end'], '%Y-%m-%d')
+    artifact = build_pdf_artifact(report_date, report_date_end, params['shift'], params.get('range_format'))
+    if artifact is None:
+        raise JobFailed(pdf_no_data_message(report_date, report_date_end, params['shift']))
+    buffer, download_name, mimetype = artifact
+    fileobj.write(buffer.getvalue())
+    return download_name, mimetype
 
-def get_hm_awal(df, no_unit):
+JOB_BUILDERS = {'export': build_export_job, 'pdf': build_pdf_job}
+
+class JobQueue:
     """
-    Gets the last HM_Akhir for a given unit from the sorted DataFrame.
-    If no records exist for the unit, it returns the initial HM_Awal.
+    Background runner for exports and reports that are too heavy for a request.
+
+    Jobs live in a SQLite table next to their artifacts, so every app process on the
+    machine shares the queue and the finished files. Work runs on a process pool (a
+    thread pool where worker processes are unavailable); the worker records its own
+    progress, so a job's status can be polled from any process. A job is keyed by its
+    kind, parameters and data version: resubmitting the same export while one is
+    queued, running or still cached returns the existing job instead of a new render.
+    Artifacts expire after ttl seconds, and the oldest are evicted once their total
+    size exceeds max_bytes. Without a directory the queue is off (see JOB_DIR) and the
+    routes build everything inline.
     """
-    # Since df is now guaranteed to be sorted chronologically by load_or_create_data(),
-    # filtering and taking the last element will correctly give the latest HM_Akhir.
-    unit_data = df[df["NO_UNIT"] == no_unit]
-    if not unit_data.empty:
-        return unit_data["HM_Akhir"].iloc[-1]
-    return INITIAL_HM_Awal.get(no_unit, 0.0)
 
-def get_penjatahan(no_unit):
-    return PENJATAHAN_MAP.get(no_unit, 62)
+    def __init__(self, directory, workers, ttl, max_bytes, timeout):
+        self.directory = directory
+        self.enabled = bool(directory)
+        self.workers = workers
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._use_threads = False
+        self._ready = False
 
-def get_max_capacity(no_unit):
-    return MAX_CAPACITY_MAP.get(no_unit, 0)
+    def submit(self, kind, params, version):
+        """
+        Returns (job, created) for the job building this artifact at this data version.
+        """
+        key = hashlib.sha1(json.dumps([kind, params, version], sort_keys=True, default=str).encode()).hexdigest()
+        now = time.time()
+        with self._connect() as conn:
+            self._sweep(conn, now)
+            existing = conn.execute(
+                "select * from jobs where key = ? and ("
+                "  (status in ('queued', 'running') and created_at > ?)"
+                "  or (status = 'done' and finished_at > ?)"
+                ") order by created_at desc limit 1",
+                (key, now - self.timeout, now - self.ttl),
+            ).fetchone()
+            if existing is not None and (existing['status'] != 'done' or os.path.exists(existing['path'])):
+                self.stats['reused'] += 1
+                return dict(existing), False
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "insert into jobs (id, key, kind, params, status, created_at) values (?, ?, ?, ?, 'queued', ?)",
+                (job_id, key, kind, json.dumps(params), now),
+            )
+        self.stats['submitted'] += 1
+        self._dispatch(job_id)
+        log_event('job_submitted', job=job_id, kind=kind)
+        return self.get(job_id), True
 
-def add_new_record(no_unit, hm_akhir, date, shift):
-    df = load_or_create_data() # Load the data, which is now sorted
-    hm_awal = get_hm_awal(df, no_unit)
-    penjatahan = get_penjatahan(no_unit)
-    max_capacity = get_max_capacity(no_unit)
+    def get(self, job_id):
+        """
+        Returns the job as a dict, or None if it is unknown or has expired.
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._connect() as conn:
+            job = conn.execute("select * from jobs where id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            job = dict(job)
+            if job['status'] in ('queued', 'running') and job['created_at'] < now - self.timeout:
+                conn.execute(
+                    "update jobs set status = 'failed', error = ?, finished_at = ? where id = ? and status = ?",
+                    ('Waktu proses habis.', now, job_id, job['status']),
+                )
+                job.update(status='failed', error='Waktu proses habis.', finished_at=now)
+            if job['status'] == 'done' and (job['finished_at'] < now - self.ttl or not os.path.exists(job['path'])):
+                return None
+            return job
 
-    if hm_akhir <= hm_awal:
-        return df, None, f"HM Akhir ({hm_akhir}) harus lebih besar dari HM Awal ({hm_awal})!"
+    def info(self):
+        if not self.enabled:
+            return {'enabled': False}
+        with self._connect() as conn:
+            counts = dict(conn.execute("select status, count(*) from jobs group by status").fetchall())
+            cached = conn.execute("select coalesce(sum(size), 0) from jobs where status = 'done'").fetchone()[0]
+        return {
+            **self.stats,
+            'enabled': True,
+            'jobs': counts,
+            'bytes': cached,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl,
+            'workers': self.workers,
+            'threads': self._use_threads,
+        }
 
-    selisih = hm_akhir - hm_awal
-    selisih = round(selisih, 2)
-    literan = selisih * penjatahan
-    buffer_stock = max_capacity - (selisih * penjatahan)
+    def run(self, job_id):
+        """
+        Builds one job's artifact; runs inside a pool worker.
+        """
+        with self._connect() as conn:
+            claimed = conn.execute(
+                "update jobs set status = 'running', started_at = ? where id = ? and status = 'queued'",
+                (time.time(), job_id),
+            ).rowcount
+            job = conn.execute("select * from jobs where id = ?", (job_id,)).fetchone()
+        if not claimed:
+            return
+        path = os.path.join(self.directory, 'artifacts', job_id)
+        try:
+            with timed(f"job_{job['kind']}"), open(path + '.tmp', 'wb') as fileobj:
+                download_name, mimetype = JOB_BUILDERS[job['kind']](json.loads(job['params']), fileobj)
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            error = str(e) if isinstance(e, JobFailed) else 'Gagal membuat file. Silakan coba lagi.'
+            if not isinstance(e, JobFailed):
+                log_event('job_failed', level=logging.ERROR, job=job_id, kind=job['kind'], error=str(e))
+            if os.path.exists(path + '.tmp'):
+                os.remove(path + '.tmp')
+            with self._connect() as conn:
+                conn.execute(
+                    "update jobs set status = 'failed', error = ?, finished_at = ? where id = ?",
+                    (error, time.time(), job_id),
+                )
+            return
+        size = os.path.getsize(path)
+        with self._connect() as conn:
+            conn.execute(
+                "update jobs set status = 'done', path = ?, size = ?, download_name = ?, mimetype = ?, finished_at = ? "
+                "where id = ?",
+                (path, size, download_name, mimetype, time.time(), job_id),
+            )
+            self._sweep(conn, time.time())
+        log_event('job_done', job=job_id, kind=job['kind'], bytes=size)
 
-    new_record = {
-        "Date": date.strftime("%Y-%m-%d"), # Date is already a string here
-        "NO_UNIT": no_unit.strip(),
-        "HM_Awal": round(hm_awal, 2),
-        "HM_Akhir": round(hm_akhir, 2),
-        "Selisih": selisih,
-        "Literan": round(literan, 2),
-        "Penjatahan": penjatahan,
-        "Max_Capacity": round(max_capacity, 2),
-        "Buffer_Stock": round(buffer_stock, 2),
-        "is_new": True,
-        "shift": shift
-    }
-    
-    # Convert 'Date' in new_record to datetime object before concatenating to df
-    # This ensures consistency with the df loaded by load_or_create_data
-    new_record_df = pd.DataFrame([new_record])
-    new_record_df["Date"] = pd.to_datetime(new_record_df["Date"], errors='coerce')
-
-    # Ensure 'shift' column exists in df before concatenation if it's new
-    if "shift" not in df.columns:
-        df["shift"] = ""
-    
-    df = pd.concat([df, new_record_df], ignore_index=True)
-    
-    # Re-sort the DataFrame after adding a new record to maintain chronological order
-    # for the *next* call to get_hm_awal without reloading all data.
-    # This is important if you plan to do multiple adds without a full page refresh.
-    df['shift_order'] = df['shift'].map({'Shift 1': 1, 'Shift 2': 2}).fillna(3)
-    df = df.sort_values(by=['Date', 'shift_order'], ascending=[True, True])
-    df = df.drop(columns=['shift_order'])
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation, committed on success and always closed
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    os.makedirs(os.path.join(self.directory, 'artifacts'), exist_ok=True)
+                    conn = self._open()
+                    try:
+                        conn.execute("pragma journal_mode = wal")
+                        conn.execute(
+                            "create table if not exists jobs ("
+                            " id text primary key, key text not null, kind text not null, params text not null,"
+                            " status text not null, error text, path text, size integer,"
+                            " download_name text, mimetype text,"
+                            " created_at real not null, started_at real, finished_at real)"
+                        )
+                        conn.execute("create index if not exists jobs_key_idx on jobs (key, created_at)")
+                        conn.commit()
+                    finally:
+                        conn.close()
+                    self._ready = True
+        conn = self._open()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
 
-    save_data(df) # Save the updated and sorted DataFrame
-    return df, new_record, None
+    def _open(self):
+        conn = sqlite3.connect(os.path.join(self.directory, 'jobs.sqlite3'), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
 
-def create_pdf_report(df, shift, date):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
+    def _sweep(self, conn, now):
+        # Expired artifacts and finished jobs go first, then the oldest artifacts until under max_bytes
+        stale = conn.execute(
+            "select id, path from jobs where status in ('done', 'failed') and finished_at < ?",
+            (now - self.ttl,),
+        ).fetchall()
+        done = conn.execute(
+            "select id, path, size from jobs where status = 'done' and finished_at >= ? order by finished_at desc",
+            (now - self.ttl,),
+        ).fetchall()
+        # The newest artifact is kept even on its own over the limit, so it can still be downloaded
+        total = 0
+        for position, job in enumerate(done):
+            total += job['size'] or 0
+            if total > self.max_bytes and position > 0:
+                stale.append(job)
+        for job in stale:
+            if job['path'] and os.path.exists(job['path']):
+                os.remove(job['path'])
+            conn.execute("delete from jobs where id = ?", (job['id'],))
+        self.stats['evicted'] += len(stale)
 
-    styles = getSampleStyleSheet()
-    shift_display = (
-        "Shift 1 (06:00–18:00 WITA)" if shift == "Shift 1" else
-        "Shift 2 (18:00–06:00 WITA)" if shift == "Shift 2" else
-        "Shift 1 & 2 (All Day)"
-    )
-    title = Paragraph(
-        f"PLAN REFUELING UNIT TRACK {date.strftime('%b %Y').upper()}"
-        f"<br/>{shift_display} Tgl: {date.strftime('%d %b %Y')}",
-        styles['Title']
-    )
-    elements.append(title)
-    elements.append(Paragraph("<br/>", styles['Normal']))
-
-    data = [["Date", "Unit", "Shift", "Est HM Jam 12:00", "HM", "Qty Plan Refueling", "Note"]]
-    for _, row in df.iterrows():
-        qty_plan = f"{row['Literan']:.2f}" if row['Literan'] > 0 else "Full" if row['Buffer_Stock'] <= 0 else "-"
-        shift_value = row.get("shift", "Unknown")
-        # Ensure 'Date' is formatted correctly for PDF
-        display_date = row["Date"].strftime("%Y-%m-%d") if pd.notna(row["Date"]) else ""
-        data.append([
-            display_date,
-            row["NO_UNIT"],
-            shift_value,
-            f"{row['HM_Awal']:.2f}",
-            f"{row['Selisih']:.2f}",
-            qty_plan,
-            ""
-        ])
-
-    col_widths = [80, 60, 60, 100, 60, 100, 100]
-    table = Table(data, colWidths=col_widths)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.goldenrod),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('LEFTPADDING', (0, 0), (-1, -1), 5),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 5),
-    ]))
-    elements.append(table)
+    def _dispatch(self, job_id):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+            executor = self._executor
+        try:
+            future = executor.submit(_run_job, job_id)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._fall_back_to_threads(e)
+            return self._dispatch(job_id)
+        future.add_done_callback(partial(self._job_finished, job_id))
 
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    def _create_executor(self):
+        if not self._use_threads:
+            try:
+                # Spawned workers import the app afresh instead of inheriting this
+                # process's open database connections and threads through fork()
+                return ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_job_worker,
+                )
+            except (OSError, NotImplementedError) as e:
+                log_event('job_pool_unavailable', level=logging.WARNING, error=str(e))
+                self._use_threads = True
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+
+    def _fall_back_to_threads(self, error):
+        log_event('job_pool_unavailable', level=logging.WARNING, error=str(error))
+        with self._lock:
+            self._use_threads = True
+            self._executor = None
+
+    def _job_finished(self, job_id, future):
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            # The worker never ran (or died mid-job); requeue it on threads
+            self._fall_back_to_threads(error)
+            with self._connect() as conn:
+                conn.execute("update jobs set status = 'queued' where id = ?", (job_id,))
+            self._dispatch(job_id)
+        elif error is not None:
+            log_event('job_failed', level=logging.ERROR, job=job_id, error=str(error))
+
+job_queue = JobQueue(JOB_DIR, JOB_WORKERS, JOB_ARTIFACT_TTL, JOB_CACHE_MAX_BYTES, JOB_TIMEOUT)
+
+def _init_job_worker():
+    # One job per worker process is enough CPU; range reports render their days in-process
+    global PDF_WORKERS
+    PDF_WORKERS = 1
+
+def _run_job(job_id):
+    # Top-level so it can be pickled into the process pool
+    job_queue.run(job_id)
+
+def job_payload(job):
+    """
+    Returns the JSON view of a job, with its download URL once it is done.
+    """
+    payload = {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'error': job['error'],
+        'status_url': url_for('job_status', job_id=job['id']),
+    }
+    if job['status'] == 'done':
+        payload['download_url'] = url_for('job_download', job_id=job['id'])
+    return payload
+
+def export_version():
+    # The data version covers every write, so it identifies both exports and PDF plans
+    # (including their forecast columns) without loading any records
+    return [data_version.current()[0], unit_registry.snapshot().version]
+
+def submit_job_response(kind, params, version):
+    """
+    Queues (or reuses) a background job and answers 202 with its status URL,
+    or 200 with the download URL when a cached artifact is ready.
+    """
+    job, _ = job_queue.submit(kind, params, version)
+    return jsonify(job_payload(job)), (200 if job['status'] == 'done' else 202)
 
 # Routes
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         unit = request.args.get('unit')
-        logger.info(f"Redirecting authenticated user to index, unit: {unit}")
+        log_event('login_redirect', user=current_user.username, unit=unit)
         return redirect(url_for('index', unit=unit) if unit else url_for('index'))
     
     if request.method == 'POST':
@@ -342,19 +3140,20 @@ def login():
                 user_data = response.data[0]
                 if check_password_hash(user_data['password_hash'], password):
                     user = User(user_data['id'], user_data['username'], user_data['role'])
+                    user_cache.put(user)
                     login_user(user)
                     unit = request.form.get('unit') or request.args.get('unit')
-                    logger.info(f"Login successful for {username}, redirecting to index, unit: {unit}")
+                    log_event('login_succeeded', user=username, unit=unit)
                     flash('Login berhasil!', 'success')
-                    return redirect(url_for('index', unit=unit) if unit and unit in LOCKED_UNITS else url_for('index'))
+                    return redirect(url_for('index', unit=unit) if unit and unit in get_units() else url_for('index'))
                 else:
-                    logger.warning(f"Failed login attempt for {username}: incorrect password")
+                    log_event('login_failed', level=logging.WARNING, user=username, reason='incorrect_password')
                     flash('Kata sandi salah.', 'error')
             else:
-                logger.warning(f"Failed login attempt: user {username} not found")
+                log_event('login_failed', level=logging.WARNING, user=username, reason='user_not_found')
                 flash('Pengguna tidak ditemukan.', 'error')
         except Exception as e:
-            logger.error(f"Error during login for {username}: {str(e)}")
+            log_event('login_error', level=logging.ERROR, user=username, error=str(e))
             flash('Terjadi kesalahan saat login. Silakan coba lagi.', 'error')
     
     response = make_response(render_template('login.html'))
@@ -364,6 +3163,7 @@ def login():
 @app.route('/logout')
 @login_required
 def logout():
+    user_cache.invalidate(current_user.id)
     logout_user()
     flash('Anda telah logout.', 'success')
     return redirect(url_for('login'))
@@ -373,56 +3173,111 @@ def logout():
 def index():
     try:
         df = load_or_create_data() # Now df is guaranteed to be sorted
-        units = LOCKED_UNITS
-        selected_unit = request.args.get('unit', units[0])
-        logger.info(f"Received unit parameter: {request.args.get('unit')} | Selected unit: {selected_unit}")
+        units = get_units()
+        selected_unit = request.args.get('unit', units[0] if units else '')
+        log_event('dashboard_unit', requested_unit=request.args.get('unit'), selected_unit=selected_unit)
         
         # Validasi selected_unit
         if selected_unit not in units:
-            logger.warning(f"Invalid unit selected: {selected_unit}, defaulting to {units[0]}")
-            selected_unit = units[0]
+            fallback_unit = units[0] if units else ''
+            log_event('dashboard_invalid_unit', level=logging.WARNING, requested_unit=selected_unit, selected_unit=fallback_unit)
+            selected_unit = fallback_unit
         
-        # get_hm_awal now correctly fetches the latest HM_Akhir due to sorted df
-        last_hm_akhir = get_hm_awal(df, selected_unit)
+        # Constant-time lookup in the per-unit index kept up to date by the record cache
+        last_hm_akhir = get_hm_awal(selected_unit)
+        forecasts = forecast_rows(get_forecasts())
 
-        filter_unit = request.args.get('filter_unit', 'Semua')
-        if filter_unit == 'Semua':
-            filtered_df = df
-        else:
-            filtered_df = df[df["NO_UNIT"] == filter_unit]
+        filters = parse_record_filters(request.args)
+        records_page = get_records_page(df, **filters)
 
         unique_units = ['Semua'] + sorted(df["NO_UNIT"].unique().tolist()) if not df.empty else ['Semua']
         
         # Render template dengan header anti-cache
-        response = make_response(render_template(
-            'index.html',
-            units=units,
-            selected_unit=selected_unit,
-            last_hm_akhir=last_hm_akhir,
-            # Convert 'Date' column to string for display in the template table
-            # Make a copy to avoid SettingWithCopyWarning if you modify the original df later
-            filtered_df=filtered_df.copy().assign(Date=filtered_df['Date'].dt.strftime('%Y-%m-%d')).to_dict(orient='records'),
-            filter_unit=filter_unit,
-            unique_units=unique_units,
-            current_user=current_user
-        ))
+        with timed('render'):
+            response = make_response(render_template(
+                'index.html',
+                units=units,
+                selected_unit=selected_unit,
+                last_hm_akhir=last_hm_akhir,
+                forecasts=forecasts,
+                selected_forecast=next((row for row in forecasts if row['NO_UNIT'] == selected_unit), None),
+                records_page=records_page,
+                filter_unit=filters['filter_unit'],
+                date_from=filters['date_from'].strftime('%Y-%m-%d') if filters['date_from'] else '',
+                date_to=filters['date_to'].strftime('%Y-%m-%d') if filters['date_to'] else '',
+                unique_units=unique_units,
+                background_jobs=job_queue.enabled,
+                current_user=current_user
+            ))
         response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
         return response
     except Exception as e:
-        logger.error(f"Error in index route: {str(e)}")
+        log_event('route_failed', level=logging.ERROR, route='index', error=str(e))
         flash("Gagal memuat data. Silakan coba lagi nanti.", 'error')
         # Return a fallback render in case of error
         return render_template(
             'index.html',
-            units=LOCKED_UNITS,
-            selected_unit=LOCKED_UNITS[0],
+            units=get_units(),
+            selected_unit=next(iter(get_units()), ''),
             last_hm_akhir=0.0,
-            filtered_df=[],
+            forecasts=[],
+            selected_forecast=None,
+            records_page={'rows': [], 'total': 0, 'page': 1, 'pages': 1, 'page_size': DEFAULT_PAGE_SIZE},
             filter_unit='Semua',
+            date_from='',
+            date_to='',
             unique_units=['Semua'],
             current_user=current_user
         )
 
+@app.route('/api/records')
+@login_required
+def api_records():
+    """
+    JSON page of the history table so the dashboard can page without a full reload.
+    """
+    try:
+        filters = parse_record_filters(request.args)
+        return conditional_response(
+            ('api_records', sorted(request.args.items(multi=True))),
+            lambda: jsonify(get_records_page(load_or_create_data(), **filters)),
+            from_cache=True,
+        )
+    except Exception as e:
+        log_event('route_failed', level=logging.ERROR, route='api_records', error=str(e))
+        return jsonify({'error': 'Gagal memuat data.'}), 500
+
+@app.route('/api/forecast')
+@login_required
+def api_forecast():
+    """
+    Per-unit burn rate, next-shift HM and time-to-empty projections.
+    """
+    try:
+        return conditional_response(
+            ('api_forecast', FORECAST_WINDOW),
+            lambda: jsonify({'window': FORECAST_WINDOW, 'units': forecast_rows(get_forecasts())}),
+            from_cache=True,
+        )
+    except Exception as e:
+        log_event('route_failed', level=logging.ERROR, route='api_forecast', error=str(e))
+        return jsonify({'error': 'Gagal memuat prakiraan.'}), 500
+
+@app.route('/api/analytics')
+@login_required
+def api_analytics():
+    """
+    Per-unit totals and averages by shift, day or ISO week over a date window.
+    """
+    try:
+        params, error = parse_analytics_params(request.args)
+        if error:
+            return jsonify({'error': error}), 400
+        return jsonify(get_analytics(**params))
+    except Exception as e:
+        log_event('route_failed', level=logging.ERROR, route='api_analytics', error=str(e))
+        return jsonify({'error': 'Gagal memuat analitik.'}), 500
+
 @app.route('/register', methods=['GET', 'POST'])
 @login_required
 def register():
@@ -435,21 +3290,24 @@ def register():
         password = request.form['password']
         role = request.form['role']
         try:
-            response = supabase.table('users').select('username').eq('username', username).execute()
-            # Supabase select returns an object with a 'data' key which is a list
-            if response.data and len(response.data) > 0: # Check if data is not empty
-                flash('Username sudah ada.', 'error')
+            password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+            # One round trip: the unique index on users.username rejects duplicates
+            supabase.table('users').insert({
+                'username': username,
+                'password_hash': password_hash,
+                'role': role
+            }).execute()
+            user_cache.invalidate()
+            flash('Pengguna berhasil ditambahkan!', 'success')
+            return redirect(url_for('index'))
+        except APIError as e:
+            if e.code != UNIQUE_VIOLATION:
+                log_event('register_failed', level=logging.ERROR, user=username, error=e.message)
+                flash('Gagal menambahkan pengguna. Silakan coba lagi.', 'error')
             else:
-                password_hash = generate_password_hash(password, method='pbkdf2:sha256')
-                supabase.table('users').insert({
-                    'username': username,
-                    'password_hash': password_hash,
-                    'role': role
-                }).execute()
-                flash('Pengguna berhasil ditambahkan!', 'success')
-                return redirect(url_for('index'))
+                flash('Username sudah ada.', 'error')
         except Exception as e:
-            logger.error(f"Error during registration: {str(e)}")
+            log_event('register_failed', level=logging.ERROR, user=username, error=str(e))
             flash('Gagal menambahkan pengguna. Silakan coba lagi.', 'error')
     
     return render_template('register.html')
@@ -467,7 +3325,7 @@ def add_record():
             flash("Invalid shift type selected.", 'error')
             return redirect(url_for('index', unit=no_unit))
 
-        df, record, error = add_new_record(no_unit, hm_akhir, date, shift)
+        record, error = add_new_record(no_unit, hm_akhir, date, shift)
         if error:
             flash(error, 'error')
         else:
@@ -480,25 +3338,55 @@ def add_record():
             )
         return redirect(url_for('index', unit=no_unit))
     except Exception as e:
-        logger.error(f"Error in add_record: {str(e)}")
+        log_event('route_failed', level=logging.ERROR, route='add_record', error=str(e))
         flash("Gagal menambahkan data. Silakan coba lagi.", 'error')
-        return redirect(url_for('index', unit=request.form.get('no_unit', LOCKED_UNITS[0])))
+        return redirect(url_for('index', unit=request.form.get('no_unit')))
+
+@app.route('/import_records', methods=['POST'])
+@login_required
+def import_records():
+    try:
+        import_file = request.files.get('import_file')
+        if not import_file or not import_file.filename:
+            flash("Pilih file CSV atau XLSX untuk diimpor.", 'error')
+            return redirect(url_for('index'))
+        try:
+            raw_df = read_import_file(import_file)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('index'))
+
+        inserted, errors_df = import_records_serialized(raw_df)
+        log_event('records_imported', user=current_user.username, file=import_file.filename, inserted=len(inserted), rejected=len(errors_df))
+
+        if errors_df.empty:
+            flash(f"{len(inserted)} data berhasil diimpor!", 'success')
+            return redirect(url_for('index'))
+
+        flash(f"{len(inserted)} data berhasil diimpor, {len(errors_df)} baris ditolak. Lihat laporan kesalahan.", 'error')
+        output = BytesIO(errors_df.to_csv(index=False).encode('utf-8'))
+        return send_file(output, mimetype='text/csv', download_name='import_errors.csv', as_attachment=True)
+    except Exception as e:
+        log_event('route_failed', level=logging.ERROR, route='import_records', error=str(e))
+        flash("Gagal mengimpor data. Silakan coba lagi.", 'error')
+        return redirect(url_for('index'))
 
 @app.route('/export_all')
 @login_required
 def export_all():
     try:
-        df = load_or_create_data()
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Ensure Date column is formatted as string for Excel export
-            df_export = df.copy()
-            df_export['Date'] = df_export['Date'].dt.strftime('%Y-%m-%d')
-            df_export.to_excel(writer, index=False)
-        output.seek(0)
-        return send_file(output, download_name='fuel_data_all.xlsx', as_attachment=True)
+        export_format = request.args.get('format', 'xlsx')
+        if export_format not in EXPORT_FORMATS:
+            flash("Format ekspor tidak valid.", 'error')
+            return redirect(url_for('index'))
+        if request.args.get('background') and job_queue.enabled:
+            return submit_job_response('export', {'unit': None, 'format': export_format}, export_version())
+        return conditional_response(
+            ('export_all', export_format),
+            lambda: export_records_response(None, 'fuel_data_all', export_format),
+        )
     except Exception as e:
-        logger.error(f"Error in export_all: {str(e)}")
+        log_event('route_failed', level=logging.ERROR, route='export_all', error=str(e))
         flash("Gagal mengekspor data. Silakan coba lagi.", 'error')
         return redirect(url_for('index'))
 
@@ -506,57 +3394,151 @@ def export_all():
 @login_required
 def export_unit(unit):
     try:
-        df = load_or_create_data()
-        df_unit = df[df["NO_UNIT"] == unit].copy() # Make a copy
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Ensure Date column is formatted as string for Excel export
-            df_unit['Date'] = df_unit['Date'].dt.strftime('%Y-%m-%d')
-            df_unit.to_excel(writer, index=False)
-        output.seek(0)
-        return send_file(output, download_name=f'fuel_data_{unit}.xlsx', as_attachment=True)
+        export_format = request.args.get('format', 'xlsx')
+        if export_format not in EXPORT_FORMATS:
+            flash("Format ekspor tidak valid.", 'error')
+            return redirect(url_for('index'))
+        if request.args.get('background') and job_queue.enabled:
+            return submit_job_response('export', {'unit': unit, 'format': export_format}, export_version())
+        return conditional_response(
+            ('export_unit', unit, export_format),
+            lambda: export_records_response(unit, f'fuel_data_{unit}', export_format),
+        )
     except Exception as e:
-        logger.error(f"Error in export_unit: {str(e)}")
+        log_event('route_failed', level=logging.ERROR, route='export_unit', error=str(e))
         flash("Gagal mengekspor data unit. Silakan coba lagi.", 'error')
         return redirect(url_for('index'))
 
-@app.route('/generate_pdf', methods=['POST'])
+@app.route('/generate_pdf', methods=['GET', 'POST'])
 @login_required
 def generate_pdf():
+    """
+    Renders the refueling plan for a day or a date range. The dashboard submits it as
+    a GET, so a browser re-downloading an unchanged plan gets a 304 instead of a new render.
+    """
     try:
-        report_date = datetime.strptime(request.form['report_date'], '%Y-%m-%d')
-        shift = request.form['shift']
+        report_date = datetime.strptime(request.values['report_date'], '%Y-%m-%d')
+        report_date_end = (
+            datetime.strptime(request.values['report_date_end'], '%Y-%m-%d')
+            if request.values.get('report_date_end') else report_date
+        )
+        shift = request.values['shift']
+        range_format = request.values.get('range_format')
         valid_shifts = ["Shift 1", "Shift 2", "Both"]
         if shift not in valid_shifts:
             flash("Shift tidak valid. Pilih Shift 1, Shift 2, atau Both.", 'error')
             return redirect(url_for('index'))
+        if report_date_end < report_date:
+            flash("Tanggal akhir harus sama atau setelah tanggal awal.", 'error')
+            return redirect(url_for('index'))
+        if report_date_end - report_date >= timedelta(days=MAX_REPORT_DAYS):
+            flash(f"Rentang laporan maksimal {MAX_REPORT_DAYS} hari.", 'error')
+            return redirect(url_for('index'))
 
-        df = load_or_create_data() # df is now sorted
-        if "shift" not in df.columns:
-            df["shift"] = ""
-        
-        if shift == "Both":
-            # Filter by date only, then sort by shift for consistent PDF output
-            report_df = df[df["Date"] == report_date].copy()
-            report_df['shift_order'] = report_df['shift'].map({'Shift 1': 1, 'Shift 2': 2}).fillna(3)
-            report_df = report_df.sort_values(by='shift_order').drop(columns=['shift_order'])
-        else:
-            report_df = df[(df["Date"] == report_date) & (df["shift"] == shift)].copy()
-
-        if not report_df.empty:
-            pdf_buffer = create_pdf_report(report_df, shift, report_date)
-            shift_display = "Shift1_0600-1800" if shift == "Shift 1" else "Shift2_1800-0600" if shift == "Shift 2" else "Both_Shifts"
-            return send_file(
-                pdf_buffer,
-                download_name=f"Plan_Refueling_Hauler_{report_date.strftime('%d_%b_%Y')}_{shift_display}.pdf",
-                as_attachment=True
+        if request.values.get('background') and job_queue.enabled:
+            params = {
+                'report_date': report_date.strftime('%Y-%m-%d'),
+                'report_date_end': report_date_end.strftime('%Y-%m-%d'),
+                'shift': shift,
+                'range_format': range_format,
+            }
+            return submit_job_response('pdf', params, export_version())
+
+        # The data version covers every write, including those behind the plan's forecast columns
+        return conditional_response(
+            ('generate_pdf', report_date, report_date_end, shift, range_format),
+            lambda: render_pdf_response(report_date, report_date_end, shift, range_format),
+        )
+    except Exception as e:
+        log_event('route_failed', level=logging.ERROR, route='generate_pdf', error=str(e))
+        flash("Gagal menghasilkan PDF. Silakan coba lagi.", 'error')
+        return redirect(url_for('index'))
+
+def build_pdf_artifact(report_date, report_date_end, shift, range_format):
+    """
+    Renders the refueling plan for a day or a date range.
+    Returns (buffer, download_name, mimetype), or None when there are no records.
+    """
+    shift_display = "Shift1_0600-1800" if shift == "Shift 1" else "Shift2_1800-0600" if shift == "Shift 2" else "Both_Shifts"
+    shift_filter = None if shift == "Both" else shift
+
+    if report_date_end != report_date:
+        # Range mode: the whole range is fetched once and rendered as one document or a ZIP
+        report_df = fetch_records_for_range(report_date, report_date_end, shift_filter)
+        if report_df.empty:
+            return None
+        report_df = attach_forecasts(report_df)
+        range_name = f"{report_date.strftime('%d_%b_%Y')}-{report_date_end.strftime('%d_%b_%Y')}_{shift_display}"
+        if range_format == 'zip':
+            return (
+                create_range_zip_report(report_df, shift, shift_display),
+                f"Plan_Refueling_Hauler_{range_name}.zip",
+                'application/zip',
             )
-        else:
-            flash(f"Tidak ada data untuk tanggal {report_date.strftime('%d %b %Y')} dan shift {shift}.", 'error')
+        return (
+            create_range_pdf_report(report_df, shift, report_date, report_date_end),
+            f"Plan_Refueling_Hauler_{range_name}.pdf",
+            'application/pdf',
+        )
+
+    # Only the requested day (and shift) is fetched; build_records_df returns it
+    # sorted by shift, which keeps the "Both" report in Shift 1, Shift 2 order
+    report_df = fetch_records_for_day(report_date, shift_filter)
+    if report_df.empty:
+        return None
+    report_df = attach_forecasts(report_df)
+    return (
+        get_pdf_report(report_df, shift, report_date),
+        f"Plan_Refueling_Hauler_{report_date.strftime('%d_%b_%Y')}_{shift_display}.pdf",
+        'application/pdf',
+    )
+
+def pdf_no_data_message(report_date, report_date_end, shift):
+    if report_date_end != report_date:
+        return (
+            f"Tidak ada data untuk tanggal {report_date.strftime('%d %b %Y')} - "
+            f"{report_date_end.strftime('%d %b %Y')} dan shift {shift}."
+        )
+    return f"Tidak ada data untuk tanggal {report_date.strftime('%d %b %Y')} dan shift {shift}."
+
+def render_pdf_response(report_date, report_date_end, shift, range_format):
+    """
+    Sends the PDF (or ZIP) download for generate_pdf, or redirects when there is no data.
+    """
+    artifact = build_pdf_artifact(report_date, report_date_end, shift, range_format)
+    if artifact is None:
+        flash(pdf_no_data_message(report_date, report_date_end, shift), 'error')
+        return redirect(url_for('index'))
+    buffer, download_name, mimetype = artifact
+    return send_file(buffer, mimetype=mimetype, download_name=download_name, as_attachment=True)
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """
+    Status of a background export or report, polled by the dashboard.
+    """
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Pekerjaan tidak ditemukan atau sudah kedaluwarsa.'}), 404
+        return jsonify(job_payload(job))
+    except Exception as e:
+        log_event('route_failed', level=logging.ERROR, route='job_status', error=str(e))
+        return jsonify({'error': 'Gagal memuat status pekerjaan.'}), 500
+
+@app.route('/jobs/<job_id>/download')
+@login_required
+def job_download(job_id):
+    try:
+        job = job_queue.get(job_id)
+        if job is None or job['status'] != 'done':
+            flash("File tidak tersedia atau sudah kedaluwarsa. Silakan buat ulang.", 'error')
             return redirect(url_for('index'))
+        return send_file(job['path'], mimetype=job['mimetype'], download_name=job['download_name'], as_attachment=True)
     except Exception as e:
-        logger.error(f"Error in generate_pdf: {str(e)}")
-        flash("Gagal menghasilkan PDF. Silakan coba lagi.", 'error')
+        log_event('route_failed', level=logging.ERROR, route='job_download', error=str(e))
+        flash("Gagal mengunduh file. Silakan coba lagi.", 'error')
         return redirect(url_for('index'))
 
 @app.route('/reset_data', methods=['POST'])
@@ -571,10 +3553,121 @@ def reset_data_route():
         flash("Semua data berhasil dihapus! Backup telah dibuat.", 'success')
         return redirect(url_for('index'))
     except Exception as e:
-        logger.error(f"Error in reset_data: {str(e)}")
+        log_event('route_failed', level=logging.ERROR, route='reset_data', error=str(e))
         flash("Gagal mereset data. Silakan coba lagi.", 'error')
         return redirect(url_for('index'))
 
+@app.route('/repair_data', methods=['POST'])
+@login_required
+def repair_data_route():
+    """
+    Admin-only full rewrite: drops exact duplicate rows and re-saves the table in
+    chronological order. This is the only path that still goes through save_data().
+    """
+    if current_user.role != 'admin':
+        flash('Hanya admin yang dapat memperbaiki data.', 'error')
+        return redirect(url_for('index'))
+    try:
+        backup_data()
+        # Not the record cache: it can lag other instances, and their newer rows would be deleted
+        df = build_records_df(fetch_all_records())
+        record_cols = [col for col in df.columns if col not in ('id', 'created_at')]
+        repaired_df = df.drop_duplicates(subset=record_cols)
+        save_data(repaired_df)
+        flash(f"Data berhasil diperbaiki! {len(df) - len(repaired_df)} baris duplikat dihapus.", 'success')
+        return redirect(url_for('index'))
+    except Exception as e:
+        log_event('route_failed', level=logging.ERROR, route='repair_data', error=str(e))
+        flash("Gagal memperbaiki data. Silakan coba lagi.", 'error')
+        return redirect(url_for('index'))
+
+@app.route('/units', methods=['GET', 'POST'])
+@login_required
+def manage_units():
+    if current_user.role != 'admin':
+        flash('Hanya admin yang dapat mengakses halaman ini.', 'error')
+        return redirect(url_for('index'))
+
+    if request.method == 'POST':
+        try:
+            no_unit = request.form['no_unit'].strip()
+            penjatahan = int(request.form['penjatahan'])
+            max_capacity = float(request.form['max_capacity'])
+            initial_hm_awal = float(request.form.get('initial_hm_awal') or 0)
+        except (KeyError, ValueError):
+            flash('Data unit tidak valid.', 'error')
+            return redirect(url_for('manage_units'))
+        if not no_unit or penjatahan <= 0 or max_capacity <= 0 or initial_hm_awal < 0:
+            flash('Unit wajib diisi, Penjatahan dan Max Kapasitas harus lebih dari 0.', 'error')
+            return redirect(url_for('manage_units'))
+        try:
+            supabase.table('units').upsert({
+                'NO_UNIT': no_unit,
+                'penjatahan': penjatahan,
+                'max_capacity': round(max_capacity, 2),
+                'initial_hm_awal': round(initial_hm_awal, 2),
+                'active': request.form.get('active') == 'on',
+            }, on_conflict='NO_UNIT').execute()
+            snapshot = unit_registry.reload()
+            log_event('unit_saved', user=current_user.username, unit=no_unit, version=snapshot.version)
+            flash(f'Unit {no_unit} berhasil disimpan.', 'success')
+        except Exception as e:
+            log_event('route_failed', level=logging.ERROR, route='manage_units', error=str(e))
+            flash('Gagal menyimpan unit. Pastikan tabel units sudah dibuat.', 'error')
+        return redirect(url_for('manage_units'))
+
+    snapshot = unit_registry.snapshot()
+    units = [
+        {
+            'NO_UNIT': unit,
+            'penjatahan': snapshot.penjatahan[unit],
+            'max_capacity': snapshot.max_capacity[unit],
+            'initial_hm_awal': snapshot.initial_hm_awal[unit],
+            'active': unit in snapshot.units,
+        }
+        for unit in snapshot.penjatahan
+    ]
+    return render_template('units.html', units=units, version=snapshot.version)
+
+@app.route('/cache', methods=['GET'])
+@login_required
+def cache_info():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Hanya admin yang dapat melihat cache.'}), 403
+    return jsonify({'records': record_cache.info(), 'reports': report_cache.info(),
+                    'users': user_cache.info(), 'forecasts': forecast_cache.info(),
+                    'units': unit_registry.info(), 'data_version': data_version.info(),
+                    'jobs': job_queue.info(), 'mirror': record_mirror.info()})
+
+@app.route('/cache/purge', methods=['POST'])
+@login_required
+def purge_cache():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Hanya admin yang dapat menghapus cache.'}), 403
+    record_cache.purge()
+    report_cache.purge()
+    user_cache.invalidate()
+    record_mirror.purge()
+    log_event('caches_purged', user=current_user.username)
+    return jsonify({'records': record_cache.info(), 'reports': report_cache.info(),
+                    'users': user_cache.info(), 'forecasts': forecast_cache.info(),
+                    'units': unit_registry.info(), 'data_version': data_version.info(),
+                    'jobs': job_queue.info(), 'mirror': record_mirror.info()})
+
+@app.route('/metrics')
+@login_required
+def metrics_route():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Hanya admin yang dapat melihat metrik.'}), 403
+    return jsonify({
+        'enabled': METRICS_ENABLED,
+        **metrics.snapshot(),
+        'caches': {'records': record_cache.info(), 'reports': report_cache.info(),
+                   'users': user_cache.info(), 'forecasts': forecast_cache.info(),
+                   'units': unit_registry.info(), 'data_version': data_version.info(),
+                   'jobs': job_queue.info(), 'mirror': record_mirror.info()},
+    })
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,105 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import app.main and serve
+its first /login and first dashboard (/) request.
+
+Every sample runs in a new interpreter, the way a serverless cold start does. The
+dashboard request runs against the in-memory Supabase stand-in, installed (untimed)
+after the login request. --eager first imports pandas, openpyxl, reportlab and
+supabase-py at module level, which is what app.main used to do at import time, so
+the two runs show what lazy loading saves. The stand-in does not import supabase-py,
+so the lazy dashboard figure leaves out the real client's own import. Runs fully offline.
+
+Usage:
+    python -m benchmarks.bench_cold_start [--runs 5] [--json report.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'reportlab', 'pyarrow', 'supabase', 'httpx')
+
+# Runs in the fresh interpreter; prints one JSON line
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+if EAGER:
+    import pandas, openpyxl, reportlab.platypus, supabase
+import app.main as fuel_app
+timings = {'import_ms': (time.perf_counter() - started) * 1000}
+fuel_app.logger.setLevel('WARNING')
+loaded = lambda: [name for name in HEAVY_MODULES if name in sys.modules]
+
+client = fuel_app.app.test_client()
+started = time.perf_counter()
+response = client.get('/login')
+timings['login_ms'] = (time.perf_counter() - started) * 1000
+assert response.status_code == 200, response.status_code
+modules = {'after_login': loaded()}
+
+from werkzeug.security import generate_password_hash
+from benchmarks.fake_supabase import FakeSupabase
+from benchmarks.synthetic import synthetic_records
+fake = FakeSupabase()
+fake.seed('users', [{'id': 1, 'username': 'bench', 'role': 'admin',
+                     'password_hash': generate_password_hash('bench', method='pbkdf2:sha256')}])
+fake.seed('units', [dict(row, active=True, updated_at='2024-01-01T00:00:00+00:00')
+                    for row in fuel_app.DEFAULT_UNIT_ROWS])
+fake.seed('fuel_records', synthetic_records(ROWS))
+fuel_app.set_supabase_client(fake)
+with client.session_transaction() as session:
+    session['_user_id'] = '1'
+    session['_fresh'] = True
+
+started = time.perf_counter()
+response = client.get('/')
+timings['dashboard_ms'] = (time.perf_counter() - started) * 1000
+assert response.status_code == 200, response.status_code
+modules['after_dashboard'] = loaded()
+print(json.dumps({'timings': timings, 'modules': modules}))
+'''
+
+
+def run_once(eager, rows):
+    env = dict(os.environ)
+    env.setdefault('SUPABASE_URL', 'http://localhost:54321')
+    env.setdefault('SUPABASE_KEY', 'benchmark.offline.key')
+    source = f'EAGER = {eager!r}\nROWS = {rows!r}\nHEAVY_MODULES = {HEAVY_MODULES!r}\n' + CHILD
+    output = subprocess.run([sys.executable, '-c', source], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def bench(eager, runs, rows):
+    samples = [run_once(eager, rows) for _ in range(runs)]
+    result = {'mode': 'eager' if eager else 'lazy', 'modules': samples[-1]['modules']}
+    for key in ('import_ms', 'login_ms', 'dashboard_ms'):
+        result[key] = round(statistics.median(sample['timings'][key] for sample in samples), 1)
+    result['cold_login_ms'] = round(result['import_ms'] + result['login_ms'], 1)
+    print(f"{result['mode']:<6} import {result['import_ms']:>7.1f} ms  first /login {result['login_ms']:>6.1f} ms  "
+          f"cold /login {result['cold_login_ms']:>7.1f} ms  first / {result['dashboard_ms']:>7.1f} ms", flush=True)
+    print(f"       loaded after /login: {', '.join(result['modules']['after_login']) or '-'}")
+    print(f"       loaded after /:      {', '.join(result['modules']['after_dashboard']) or '-'}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold-start import and first-request time in fresh processes.')
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per mode; the median is reported')
+    parser.add_argument('--rows', type=int, default=1000, help='fuel_records rows seeded for the dashboard request')
+    parser.add_argument('--json', help='write the machine-readable report to this file')
+    args = parser.parse_args()
+
+    results = [bench(eager, args.runs, args.rows) for eager in (True, False)]
+    eager, lazy = results
+    print(f"\ncold /login {eager['cold_login_ms']:.1f} -> {lazy['cold_login_ms']:.1f} ms, "
+          f"cold / {eager['import_ms'] + eager['login_ms'] + eager['dashboard_ms']:.1f} -> "
+          f"{lazy['import_ms'] + lazy['login_ms'] + lazy['dashboard_ms']:.1f} ms (import + /login + /)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'runs': args.runs, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
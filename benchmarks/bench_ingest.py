@@ -0,0 +1,74 @@
+"""
+Compares the pre-schema ingestion of fuel records (DataFrame from dicts followed by
+a chain of astype/round/strip passes) with build_records_df.
+
+Usage:
+    python -m benchmarks.bench_ingest [--rows 100000] [--repeat 3] [--json report.json]
+"""
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_records
+from app.main import build_records_df
+
+
+def legacy_build_records_df(records):
+    # The conversion chain load_or_create_data used before the typed schema
+    df = pd.DataFrame(records)
+    df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
+    df["NO_UNIT"] = df["NO_UNIT"].astype(str).str.strip()
+    df["HM_Awal"] = df["HM_Awal"].astype(float).round(2)
+    df["HM_Akhir"] = df["HM_Akhir"].astype(float).round(2)
+    df["Selisih"] = df["Selisih"].astype(float).round(2)
+    df["Literan"] = df["Literan"].astype(float).round(2)
+    df["Penjatahan"] = df["Penjatahan"].astype(int)
+    df["Max_Capacity"] = df["Max_Capacity"].astype(float).round(2)
+    df["Buffer_Stock"] = df["Buffer_Stock"].astype(float).round(2)
+    df["is_new"] = df["is_new"].astype(bool)
+    df["shift"] = df["shift"].astype(str).str.strip().replace('nan', '')
+    df['shift_order'] = df['shift'].map({'Shift 1': 1, 'Shift 2': 2}).fillna(3)
+    df = df.sort_values(by=['Date', 'shift_order'], ascending=[True, True])
+    return df.drop(columns=['shift_order'])
+
+
+def measure(build, records, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df = build(records)
+        timings.append(time.perf_counter() - started)
+    memory = int(df.memory_usage(deep=True).sum())
+    return {
+        'load_seconds_best': round(min(timings), 4),
+        'memory_bytes': memory,
+        'memory_bytes_per_100k_rows': int(memory * 100_000 / max(len(df), 1)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+
+    records = synthetic_records(args.rows)
+    report = {
+        'rows': args.rows,
+        'before': measure(legacy_build_records_df, records, args.repeat),
+        'after': measure(build_records_df, records, args.repeat),
+    }
+    for label in ('before', 'after'):
+        result = report[label]
+        print(f"{label:>6}: {result['load_seconds_best']:.3f}s, "
+              f"{result['memory_bytes_per_100k_rows'] / 2**20:.1f} MiB per 100k rows")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+Route benchmark for the Flask app against an in-memory Supabase stand-in.
+
+For every history size it seeds the built-in fleet and synthetic records for it, then
+drives index, add_record, export_all (also revalidated with If-None-Match), export_unit
+and generate_pdf through the Flask test client and reports latency percentiles, the
+first (cold) request, Supabase calls per request and the route's peak memory. Runs fully offline.
+
+Peak memory is measured on one extra, untimed request per route with tracemalloc, whose
+peak is reset first, so each figure is that request's own peak allocation above what was
+already live. It covers Python objects and numpy/pandas buffers; the process-wide peak
+RSS is printed once per size, since it only ever grows over the run.
+
+Usage:
+    python -m benchmarks.bench_routes [--sizes 1000,10000,100000,1000000]
+        [--iterations 10] [--latency-ms 0] [--json report.json] [--baseline old.json]
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from benchmarks.synthetic import FLEET, synthetic_records
+from benchmarks.fake_supabase import FakeSupabase
+import app.main as fuel_app
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def peak_rss_mib():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+def peak_alloc_mib(send, client, i):
+    """
+    Sends one request with tracemalloc running and returns its peak allocation in MiB.
+    """
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        live, _ = tracemalloc.get_traced_memory()
+        send(client, i).get_data()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round((peak - live) / 2**20, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def install_fake(latency):
+    """
+    Points app.main at a fresh stand-in and drops every process-level cache.
+    """
+    fake = FakeSupabase(latency=latency)
+    fake.seed('users', [{
+        'id': 1, 'username': 'bench', 'role': 'admin',
+        'password_hash': generate_password_hash('bench', method='pbkdf2:sha256'),
+    }])
+    fake.seed('units', [dict(row, active=True, updated_at='2024-01-01T00:00:00+00:00')
+                        for row in fuel_app.DEFAULT_UNIT_ROWS])
+    fuel_app.set_supabase_client(fake)
+    fuel_app.unit_registry.reload()
+    fuel_app.record_cache.purge()
+    fuel_app.report_cache.purge()
+    fuel_app.user_cache.invalidate()
+    return fake
+
+
+def logged_in_client():
+    client = fuel_app.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    return client
+
+
+def route_requests(records):
+    """
+    Returns {route: callable(client, i)} issuing one request per call.
+    """
+    last = records[-1]
+    last_day = date.fromisoformat(last['Date'])
+    unit = FLEET.units[0]
+    hm_start = max(r['HM_Akhir'] for r in records if r['NO_UNIT'] == unit)
+
+    def add_record(client, i):
+        return client.post('/add_record', data={
+            'no_unit': unit,
+            'hm_akhir': str(hm_start + 5 * (i + 1)),
+            'date': (last_day + timedelta(days=1 + i)).isoformat(),
+            'shift': 'Shift 1',
+        })
+
+    def export_all_revalidate(client, i):
+        # A poller that already holds the current export only pays for the version check
+        if 'etag' not in cached:
+            cached['etag'] = client.get('/export_all').headers.get('ETag')
+        return client.get('/export_all', headers={'If-None-Match': cached['etag']})
+
+    cached = {}
+    return {
+        'index': lambda client, i: client.get('/'),
+        'add_record': add_record,
+        'export_all': lambda client, i: client.get('/export_all'),
+        'export_all_304': export_all_revalidate,
+        'export_unit': lambda client, i: client.get(f'/export_unit/{unit}'),
+        'generate_pdf': lambda client, i: client.post('/generate_pdf', data={
+            'report_date': last['Date'], 'shift': 'Both',
+        }),
+    }
+
+
+def bench_size(size, iterations, latency):
+    records = synthetic_records(size)
+    fake = install_fake(latency)
+    fake.seed('fuel_records', records)
+    client = logged_in_client()
+    results = []
+    for route, send in route_requests(records).items():
+        timings = []
+        calls_before = sum(fake.calls.values())
+        for i in range(iterations):
+            started = time.perf_counter()
+            response = send(client, i)
+            response.get_data()  # drain streamed bodies
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{route} returned {response.status_code} at {size} rows')
+        calls = sum(fake.calls.values()) - calls_before
+        # Untimed: tracemalloc slows every allocation down
+        peak_mib = peak_alloc_mib(send, client, iterations)
+        results.append({
+            'size': size,
+            'route': route,
+            'cold_ms': round(timings[0], 2),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'db_calls_per_request': round(calls / iterations, 2),
+            'peak_alloc_mib': peak_mib,
+        })
+        print(f"{size:>9} {route:<14} p50 {results[-1]['p50_ms']:>9.2f} ms  p95 {results[-1]['p95_ms']:>9.2f} ms  "
+              f"cold {results[-1]['cold_ms']:>9.2f} ms  db {results[-1]['db_calls_per_request']:>7.2f}  "
+              f"peak {results[-1]['peak_alloc_mib']:>7.1f} MiB", flush=True)
+    print(f"{size:>9} process peak RSS so far {peak_rss_mib():.1f} MiB", flush=True)
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['size'], r['route']): r for r in json.load(f)['results']}
+    print(f"\nagainst {baseline_path}:")
+    for result in results:
+        old = baseline.get((result['size'], result['route']))
+        if old and old['p50_ms']:
+            print(f"{result['size']:>9} {result['route']:<14} p50 x{result['p50_ms'] / old['p50_ms']:.2f}  "
+                  f"db calls {old['db_calls_per_request']} -> {result['db_calls_per_request']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Flask routes against an offline Supabase stand-in.')
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma-separated history sizes (e.g. 1000,10000,100000,1000000)')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated round-trip time per Supabase call')
+    parser.add_argument('--json', help='write the machine-readable report to this file')
+    parser.add_argument('--baseline', help='earlier --json report to compare against')
+    args = parser.parse_args()
+
+    # Keep the per-request log lines out of the report
+    fuel_app.logger.setLevel('WARNING')
+    results = []
+    for size in (int(value) for value in args.sizes.split(',')):
+        results.extend(bench_size(size, args.iterations, args.latency_ms / 1000))
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'iterations': args.iterations,
+        'latency_ms': args.latency_ms,
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
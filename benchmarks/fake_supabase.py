@@ -0,0 +1,448 @@
+"""
+In-memory stand-in for the part of the supabase-py client that app/main.py uses.
+
+Rows are kept per table in id order, the query builder mirrors postgrest-py's
+chaining (select/insert/upsert/update/delete, eq/neq/gt/gte/lt/lte/in_, or_,
+order, limit, range, execute) and every execute() is counted per table and action so
+benchmarks can report database round trips per route. Like a default PostgREST
+deployment, a single response never returns more than 1000 rows. Columns listed in
+unique (table -> column names) reject duplicate inserts with Postgres error 23505.
+"""
+import bisect
+import copy
+import itertools
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from postgrest.exceptions import APIError
+
+MAX_ROWS = 1000
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _coerce(row_value, value):
+    # PostgREST compares on the column type; filter values often arrive as strings
+    if isinstance(row_value, (int, float)) and not isinstance(row_value, bool) and isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _test(row, op, column, value):
+    if op in ('or', 'and'):
+        combine = any if op == 'or' else all
+        return combine(_test(row, *condition) for condition in value)
+    row_value = row.get(column)
+    if op == 'in':
+        return row_value in value
+    if op == 'is':
+        return row_value is None if value == 'null' else row_value is (value == 'true')
+    value = _coerce(row_value, value)
+    if op == 'eq':
+        return row_value == value
+    if op == 'neq':
+        return row_value != value
+    if row_value is None:
+        return False
+    return {'gt': row_value > value, 'gte': row_value >= value,
+            'lt': row_value < value, 'lte': row_value <= value}[op]
+
+
+def _split_logic(text):
+    # Splits on the top-level commas, outside parentheses and double quotes
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char in '()':
+            depth += 1 if char == '(' else -1
+        elif not quoted and depth == 0 and char == ',':
+            parts.append(current)
+            current = ''
+            continue
+        current += char
+    return parts + [current]
+
+
+def _parse_logic(text):
+    """
+    Parses a PostgREST logic filter such as 'a.gt.1,and(b.eq."x y",c.is.null)' into
+    (op, column, value) conditions, where and/or nodes carry a list of conditions.
+    """
+    conditions = []
+    for part in _split_logic(text):
+        if part.startswith(('and(', 'or(')):
+            op, inner = part.split('(', 1)
+            conditions.append((op, None, _parse_logic(inner[:-1])))
+            continue
+        column, op, value = part.split('.', 2)
+        if value.startswith('"'):
+            value = value[1:-1].replace('\\"', '"')
+        conditions.append((op, column, value))
+    return conditions
+
+
+def _sort_key(value):
+    return (value is None, value if value is not None else 0)
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.action = 'select'
+        self.columns = None
+        self.payload = None
+        self.on_conflict = 'id'
+        self.count = None
+        self.filters = []
+        self.orders = []
+        self.limit_n = None
+        self.offset = 0
+
+    def select(self, *columns, count=None, head=None):
+        self.action = 'select'
+        selected = ','.join(columns).replace(' ', '')
+        self.columns = None if selected in ('', '*') else selected.split(',')
+        self.count = count
+        return self
+
+    def insert(self, json, **kwargs):
+        self.action = 'insert'
+        self.payload = json
+        return self
+
+    def upsert(self, json, on_conflict='', **kwargs):
+        self.action = 'upsert'
+        self.payload = json
+        self.on_conflict = on_conflict or 'id'
+        return self
+
+    def update(self, json, **kwargs):
+        self.action = 'update'
+        self.payload = json
+        return self
+
+    def delete(self, **kwargs):
+        self.action = 'delete'
+        return self
+
+    def _filter(self, op, column, value):
+        self.filters.append((op, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter('eq', column, value)
+
+    def neq(self, column, value):
+        return self._filter('neq', column, value)
+
+    def gt(self, column, value):
+        return self._filter('gt', column, value)
+
+    def gte(self, column, value):
+        return self._filter('gte', column, value)
+
+    def lt(self, column, value):
+        return self._filter('lt', column, value)
+
+    def lte(self, column, value):
+        return self._filter('lte', column, value)
+
+    def in_(self, column, values):
+        return self._filter('in', column, list(values))
+
+    def or_(self, filters, reference_table=None):
+        return self._filter('or', None, _parse_logic(filters))
+
+    def order(self, column, *, desc=False, nullsfirst=False, foreign_table=None):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size, *, foreign_table=None):
+        self.limit_n = size
+        return self
+
+    def range(self, start, end, foreign_table=None):
+        self.offset = start
+        self.limit_n = end - start + 1
+        return self
+
+    def matches(self, row, filters=None):
+        return all(_test(row, *condition) for condition in (self.filters if filters is None else filters))
+
+    def execute(self):
+        return self.client.execute(self)
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.client.calls[f'rpc:{self.name}'] += 1
+        self.client.simulate_latency()
+        handler = self.client.rpc_handlers.get(self.name)
+        if handler is None:
+            raise APIError({'code': 'PGRST202', 'message': f'Could not find the function public.{self.name}'})
+        with self.client.lock:
+            return FakeResponse(handler(self.client, **self.params))
+
+
+class FakeSupabase:
+    """
+    Drop-in replacement for the supabase Client object used by app.main.
+    rpc_handlers maps function names to callables taking (client, **params).
+    """
+
+    def __init__(self, latency=0.0, unique=None):
+        self.latency = latency
+        self.tables = {}
+        self.ids = {}
+        self.next_ids = Counter()
+        self.calls = Counter()
+        self.rpc_handlers = {}
+        self.unique = unique if unique is not None else {'users': ['username']}
+        self.lock = threading.RLock()
+        self.versions = Counter()
+        self._sorted = {}
+        # Like the data_versions migration: counter rows per versioned table and unit,
+        # starting with the table-wide row, bumped per write statement
+        self.versioned = {'fuel_records'}
+        for name in sorted(self.versioned):
+            self._store('data_versions', {'name': name, 'unit': '', 'version': 0, 'generation': 0,
+                                          'updated_at': datetime.now(timezone.utc).isoformat()})
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params or {})
+
+    def simulate_latency(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def seed(self, table, rows):
+        """
+        Loads rows without counting them as calls; ids are assigned when missing.
+        """
+        with self.lock:
+            for row in rows:
+                self._store(table, dict(row))
+            self._bump_data_version(table, rows, rewrite=False)
+
+    def _bump_data_version(self, table, rows, rewrite):
+        # Stand-in for the bump_fuel_records_version statement triggers: one counter row per unit written
+        if table not in self.versioned:
+            return
+        counters = self.tables.setdefault('data_versions', [])
+        for unit in sorted({row.get('NO_UNIT') or '' for row in rows}):
+            counter = next((c for c in counters if c['name'] == table and c['unit'] == unit), None)
+            if counter is None:
+                counter = self._store('data_versions', {'name': table, 'unit': unit, 'version': 0, 'generation': 0})
+            counter['version'] += 1
+            counter['generation'] += 1 if rewrite else 0
+            counter['updated_at'] = datetime.now(timezone.utc).isoformat()
+            self.versions['data_versions'] += 1
+
+    def _store(self, table, row):
+        self.versions[table] += 1
+        rows = self.tables.setdefault(table, [])
+        ids = self.ids.setdefault(table, [])
+        if row.get('id') is None:
+            self.next_ids[table] += 1
+            row['id'] = self.next_ids[table]
+        else:
+            self.next_ids[table] = max(self.next_ids[table], row['id'])
+        row.setdefault('created_at', datetime.now(timezone.utc).isoformat())
+        if not ids or row['id'] > ids[-1]:
+            rows.append(row)
+            ids.append(row['id'])
+        else:
+            position = bisect.bisect_left(ids, row['id'])
+            rows.insert(position, row)
+            ids.insert(position, row['id'])
+        return row
+
+    def _check_unique(self, table, rows, item):
+        for column in self.unique.get(table, ()):
+            if item.get(column) is not None and any(row.get(column) == item[column] for row in rows):
+                raise APIError({
+                    'code': '23505',
+                    'message': f'duplicate key value violates unique constraint "{table}_{column}_key"',
+                })
+
+    def _candidates(self, query, rows, ids):
+        # Keyset pages (id > x [and id <= y] ordered by id) are sliced with a bisect instead of a full scan
+        if query.orders in ([], [('id', False)]):
+            lower = [value for op, column, value in query.filters if column == 'id' and op == 'gt']
+            upper = [value for op, column, value in query.filters if column == 'id' and op == 'lte']
+            start = bisect.bisect_right(ids, max(lower)) if lower else 0
+            stop = bisect.bisect_right(ids, min(upper)) if upper else None
+            if lower or upper:
+                return itertools.islice(rows, start, stop), True
+            return rows, True
+        return rows, False
+
+    def _filtered_sorted(self, query, rows):
+        # Paged reads repeat the same filter and order for every page, so the
+        # sorted result is kept until the table changes, much like a database index.
+        # Logic (or) filters carry the keyset position of a page and are applied afterwards.
+        base = [f for f in query.filters if f[0] != 'or']
+        logic = [f for f in query.filters if f[0] == 'or']
+        key = (query.table, self.versions[query.table], repr(base), tuple(query.orders))
+        matched = self._sorted.get(key)
+        if matched is None:
+            matched = [row for row in rows if query.matches(row, base)]
+            for column, desc in reversed(query.orders):
+                matched.sort(key=lambda row: _sort_key(row.get(column)), reverse=desc)
+            self._sorted = {k: v for k, v in self._sorted.items() if k[:2] == key[:2]}
+            self._sorted[key] = matched
+        if logic:
+            matched = [row for row in matched if query.matches(row, logic)]
+        return matched
+
+    def execute(self, query):
+        self.calls[f'{query.table}:{query.action}'] += 1
+        self.simulate_latency()
+        with self.lock:
+            rows = self.tables.setdefault(query.table, [])
+            ids = self.ids.setdefault(query.table, [])
+
+            if query.action in ('insert', 'upsert'):
+                payload = query.payload if isinstance(query.payload, list) else [query.payload]
+                written = []
+                self._bump_data_version(query.table, payload, rewrite=query.action == 'upsert')
+                for item in payload:
+                    item = copy.deepcopy(item)
+                    if query.action == 'insert':
+                        self._check_unique(query.table, rows, item)
+                    if query.action == 'upsert':
+                        keys = query.on_conflict.split(',')
+                        existing = next((r for r in rows if all(r.get(k) == item.get(k) for k in keys)), None)
+                        if existing is not None:
+                            existing.update(item)
+                            self.versions[query.table] += 1
+                            written.append(dict(existing))
+                            continue
+                    written.append(dict(self._store(query.table, item)))
+                return FakeResponse(written)
+
+            if query.action == 'delete':
+                kept, deleted = [], []
+                for row in rows:
+                    (deleted if query.matches(row) else kept).append(row)
+                self.tables[query.table] = kept
+                self.ids[query.table] = [row['id'] for row in kept]
+                self.versions[query.table] += 1
+                self._bump_data_version(query.table, deleted, rewrite=True)
+                return FakeResponse(deleted)
+
+            if query.action == 'update':
+                updated = [row for row in rows if query.matches(row)]
+                before = [dict(row) for row in updated]
+                for row in updated:
+                    row.update(query.payload)
+                self.versions[query.table] += 1
+                self._bump_data_version(query.table, before + updated, rewrite=True)
+                return FakeResponse([dict(row) for row in updated])
+
+            limit = min(query.limit_n or MAX_ROWS, MAX_ROWS)
+            candidates, id_ordered = self._candidates(query, rows, ids)
+            if id_ordered and not query.count:
+                matched = []
+                for row in candidates:
+                    if query.matches(row):
+                        matched.append(row)
+                        if len(matched) >= query.offset + limit:
+                            break
+                total = None
+            else:
+                matched = self._filtered_sorted(query, candidates)
+                total = len(matched)
+            matched = matched[query.offset:query.offset + limit]
+            if query.columns:
+                data = [{column: row.get(column) for column in query.columns} for row in matched]
+            else:
+                data = [dict(row) for row in matched]
+            return FakeResponse(data, count=total if query.count else None)
+
+
+def insert_fuel_record(client, p_record, p_initial_hm_awal=0):
+    """
+    Stand-in for the insert_fuel_record function in supabase/migrations. RPC handlers
+    run under the client's lock, which plays the part of the per-unit advisory lock.
+    """
+    unit = p_record['NO_UNIT']
+    rows = [row for row in client.tables.get('fuel_records', []) if row.get('NO_UNIT') == unit]
+    latest = max(rows, key=lambda row: (row.get('Date') or '', row.get('shift') or '', row['id']), default=None)
+    hm_awal = round(latest['HM_Akhir'] if latest else p_initial_hm_awal, 2)
+    hm_akhir = round(float(p_record['HM_Akhir']), 2)
+    if hm_akhir <= hm_awal:
+        raise APIError({'code': 'P0001', 'message': 'HM_AKHIR_NOT_INCREASING', 'hint': str(hm_awal)})
+    selisih = round(hm_akhir - hm_awal, 2)
+    row = dict(
+        p_record,
+        HM_Awal=hm_awal,
+        HM_Akhir=hm_akhir,
+        Selisih=selisih,
+        Literan=round(selisih * p_record['Penjatahan'], 2),
+        Buffer_Stock=round(p_record['Max_Capacity'] - selisih * p_record['Penjatahan'], 2),
+        is_new=True,
+    )
+    stored = dict(client._store('fuel_records', row))
+    client._bump_data_version('fuel_records', [stored], rewrite=False)
+    return stored
+
+
+def insert_fuel_records(client, p_records, p_initial_hm_awal=None):
+    """
+    Stand-in for the insert_fuel_records function: chains each unit's rows onto its
+    latest stored row, skipping rows not after it or not increasing, and inserts the
+    rest in the given order as one statement.
+    """
+    accepted = []
+    for unit in sorted({record['NO_UNIT'] for record in p_records}):
+        rows = [row for row in client.tables.get('fuel_records', []) if row.get('NO_UNIT') == unit]
+        latest = max(rows, key=lambda row: (row.get('Date') or '', row.get('shift') or '', row['id']), default=None)
+        latest_key = (latest['Date'], latest['shift']) if latest else None
+        hm_awal = round(latest['HM_Akhir'] if latest else (p_initial_hm_awal or {}).get(unit, 0), 2)
+        for n, record in enumerate(p_records):
+            if record['NO_UNIT'] != unit:
+                continue
+            hm_akhir = round(float(record['HM_Akhir']), 2)
+            if hm_akhir <= hm_awal or (latest_key and (record['Date'], record['shift']) <= latest_key):
+                continue
+            selisih = round(hm_akhir - hm_awal, 2)
+            accepted.append((n, dict(
+                record,
+                HM_Awal=hm_awal,
+                HM_Akhir=hm_akhir,
+                Selisih=selisih,
+                Literan=round(selisih * record['Penjatahan'], 2),
+                Buffer_Stock=round(record['Max_Capacity'] - selisih * record['Penjatahan'], 2),
+                is_new=True,
+            )))
+            hm_awal, latest_key = hm_akhir, (record['Date'], record['shift'])
+    stored = [dict(client._store('fuel_records', row)) for _, row in sorted(accepted, key=lambda item: item[0])]
+    client._bump_data_version('fuel_records', stored, rewrite=False)
+    return stored
+
+
+# Database functions created by supabase/migrations, for installing into rpc_handlers
+MIGRATION_RPCS = {
+    'insert_fuel_record': insert_fuel_record,
+    'insert_fuel_records': insert_fuel_records,
+}
@@ -0,0 +1,139 @@
+"""
+Stress test for concurrent HM entries against the in-memory Supabase stand-in.
+
+Fires entries from a thread pool for several units at once, every unit receiving
+increasing HM_Akhir values (one day apart) while earlier ones are still in flight.
+Entries come in runs of --import-size: every other run goes through the bulk import
+as one file, the rest through add_new_record one by one, so imports race with single
+entries for the same unit. Afterwards it checks that each unit's stored rows still
+form one unbroken chain (every HM_Awal equals the previous row's HM_Akhir and HM_Akhir
+strictly increases). Runs each write path in turn:
+
+    unserialized  read-validate-insert with no locking (the old behaviour)
+    unit-locks    the in-process per-unit locks used when the RPCs are missing
+    rpc           the insert_fuel_record and insert_fuel_records database functions
+
+Usage:
+    python -m benchmarks.stress_entries [--units 4] [--entries 40] [--import-size 5]
+        [--threads 16] [--latency-ms 5] [--modes unserialized,unit-locks,rpc]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import date, timedelta
+
+import pandas as pd
+
+from werkzeug.security import generate_password_hash
+
+from benchmarks.synthetic import FLEET
+from benchmarks.fake_supabase import MIGRATION_RPCS, FakeSupabase
+import app.main as fuel_app
+
+
+def install_fake(latency, mode):
+    fake = FakeSupabase(latency=latency)
+    if mode == 'rpc':
+        fake.rpc_handlers.update(MIGRATION_RPCS)
+    fake.seed('users', [{
+        'id': 1, 'username': 'stress', 'role': 'admin',
+        'password_hash': generate_password_hash('stress', method='pbkdf2:sha256'),
+    }])
+    fake.seed('units', [dict(row, active=True, updated_at='2024-01-01T00:00:00+00:00')
+                        for row in fuel_app.DEFAULT_UNIT_ROWS])
+    fuel_app.set_supabase_client(fake)
+    fuel_app.unit_registry.reload()
+    fuel_app.record_cache.purge()
+    fuel_app._insert_rpc_available = None
+    fuel_app._import_rpc_available = None
+    fuel_app.unit_locks = fuel_app.UnitLocks() if mode != 'unserialized' else (lambda no_unit: nullcontext())
+    return fake
+
+
+def chain_breaks(fake, unit):
+    """
+    Counts rows whose HM_Awal does not continue the previous row or whose HM_Akhir does not increase.
+    """
+    rows = [row for row in fake.tables.get('fuel_records', []) if row['NO_UNIT'] == unit]
+    previous = round(FLEET.initial_hm_awal[unit], 2)
+    breaks = 0
+    for row in rows:
+        if row['HM_Awal'] != previous or row['HM_Akhir'] <= row['HM_Awal']:
+            breaks += 1
+        previous = row['HM_Akhir']
+    return breaks
+
+
+def entry_tasks(units, entries, import_size):
+    """
+    Returns tasks of (unit, [(day, hm_akhir), ...], as_import); single entries hold one reading.
+    """
+    first_day = date(2024, 1, 1)
+    tasks = []
+    # Round-robin over the units, so several entries per unit are in flight at once
+    for start in range(0, entries, import_size):
+        for unit in units:
+            readings = [(first_day + timedelta(days=k), FLEET.initial_hm_awal[unit] + 10 * (k + 1))
+                        for k in range(start, min(start + import_size, entries))]
+            if (start // import_size) % 2:
+                tasks.append((unit, readings, True))
+            else:
+                tasks.extend((unit, [reading], False) for reading in readings)
+    return tasks
+
+
+def run_mode(mode, units, entries, import_size, threads, latency):
+    fake = install_fake(latency, mode)
+    tasks = entry_tasks(units, entries, import_size)
+
+    def submit(task):
+        unit, readings, as_import = task
+        if as_import:
+            raw_df = pd.DataFrame({
+                'Date': [day.isoformat() for day, _ in readings],
+                'NO_UNIT': unit,
+                'HM_Akhir': [hm_akhir for _, hm_akhir in readings],
+                'shift': 'Shift 1',
+            })
+            inserted, errors_df = fuel_app.import_records_serialized(raw_df)
+            return len(inserted)
+        (day, hm_akhir), = readings
+        record, error = fuel_app.add_new_record(unit, hm_akhir, day, 'Shift 1')
+        return int(error is None)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        accepted = sum(pool.map(submit, tasks))
+    elapsed = time.perf_counter() - started
+
+    total = len(units) * entries
+    breaks = sum(chain_breaks(fake, unit) for unit in units)
+    print(f"{mode:<13} entries {total:>5}  accepted {accepted:>5}  rejected {total - accepted:>5}  "
+          f"chain breaks {breaks:>4}  {elapsed:>7.2f} s  {total / elapsed:>8.1f} entries/s", flush=True)
+    return breaks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fire concurrent HM entries at the offline Supabase stand-in.')
+    parser.add_argument('--units', type=int, default=4, help='number of units written to at once')
+    parser.add_argument('--entries', type=int, default=40, help='entries per unit')
+    parser.add_argument('--import-size', type=int, default=5, help='readings per imported file')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='simulated round-trip time per Supabase call')
+    parser.add_argument('--modes', default='unserialized,unit-locks,rpc')
+    args = parser.parse_args()
+
+    fuel_app.logger.setLevel('ERROR')
+    units = FLEET.units[:args.units]
+    failed = False
+    for mode in args.modes.split(','):
+        breaks = run_mode(mode, units, args.entries, args.import_size, args.threads, args.latency_ms / 1000)
+        # The unserialized path is the baseline that is expected to break chains
+        failed = failed or (mode != 'unserialized' and breaks > 0)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
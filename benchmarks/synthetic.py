@@ -0,0 +1,51 @@
+"""
+Synthetic fleet history shaped like the rows stored in Supabase's fuel_records table.
+"""
+import os
+import random
+from datetime import date, timedelta
+
+# app.main requires the Supabase settings at import time; benchmarks run offline,
+# so make sure they exist (the client is never created during a benchmark)
+os.environ.setdefault('SUPABASE_URL', 'http://localhost:54321')
+os.environ.setdefault('SUPABASE_KEY', 'benchmark.offline.key')
+
+from app.main import DEFAULT_UNIT_ROWS, build_unit_snapshot
+
+# The built-in fleet; benchmarks seed the same rows into the stand-in's units table
+FLEET = build_unit_snapshot('builtin', DEFAULT_UNIT_ROWS)
+
+
+def synthetic_records(n_rows, units=FLEET.units, start=date(2024, 1, 1), seed=42):
+    """
+    Returns n_rows raw records cycling through units and shifts day by day,
+    with a continuous HM_Awal/HM_Akhir chain per unit and ids in insertion order.
+    """
+    rng = random.Random(seed)
+    hm = {unit: FLEET.initial_hm_awal.get(unit, 0.0) for unit in units}
+    records = []
+    slots_per_day = len(units) * 2
+    for i in range(n_rows):
+        day, slot = divmod(i, slots_per_day)
+        shift = 'Shift 1' if slot < len(units) else 'Shift 2'
+        unit = units[slot % len(units)]
+        selisih = round(rng.uniform(2.0, 11.5), 2)
+        penjatahan = FLEET.penjatahan[unit]
+        max_capacity = FLEET.max_capacity[unit]
+        hm_awal = hm[unit]
+        hm[unit] = round(hm_awal + selisih, 2)
+        records.append({
+            'id': i + 1,
+            'Date': (start + timedelta(days=day)).isoformat(),
+            'NO_UNIT': unit,
+            'HM_Awal': hm_awal,
+            'HM_Akhir': hm[unit],
+            'Selisih': selisih,
+            'Literan': round(selisih * penjatahan, 2),
+            'Penjatahan': penjatahan,
+            'Max_Capacity': max_capacity,
+            'Buffer_Stock': round(max_capacity - selisih * penjatahan, 2),
+            'is_new': True,
+            'shift': shift,
+        })
+    return records
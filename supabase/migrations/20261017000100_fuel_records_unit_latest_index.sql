@@ -0,0 +1,4 @@
+-- Supports the "latest row for this unit" lookup used by add_new_record:
+--   select ... where "NO_UNIT" = $1 order by "Date" desc, shift desc, id desc limit 1
+create index if not exists fuel_records_unit_date_shift_idx
+    on public.fuel_records ("NO_UNIT", "Date" desc, shift desc, id desc);
@@ -0,0 +1,4 @@
+-- Supports single-day report queries such as generate_pdf:
+--   select * from fuel_records where "Date" = $1 [and shift = $2] order by id
+create index if not exists fuel_records_date_shift_unit_idx
+    on public.fuel_records ("Date", shift, "NO_UNIT");
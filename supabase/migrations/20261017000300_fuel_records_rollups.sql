@@ -0,0 +1,164 @@
+-- Per-shift and per-ISO-week rollups of fuel_records backing /api/analytics.
+-- Statement triggers refresh only the (unit, date, shift) and (unit, week) keys touched
+-- by each insert, update or delete, so the dashboard never aggregates the full history.
+create table if not exists public.fuel_rollup_shift (
+    "NO_UNIT" text not null,
+    "Date" date not null,
+    shift text not null,
+    record_count integer not null,
+    total_literan double precision not null,
+    total_selisih double precision not null,
+    total_buffer_stock double precision not null,
+    min_buffer_stock double precision,
+    updated_at timestamptz not null default now(),
+    primary key ("NO_UNIT", "Date", shift)
+);
+
+create index if not exists fuel_rollup_shift_date_idx
+    on public.fuel_rollup_shift ("Date", "NO_UNIT");
+
+create table if not exists public.fuel_rollup_week (
+    "NO_UNIT" text not null,
+    week_start date not null,
+    record_count integer not null,
+    total_literan double precision not null,
+    total_selisih double precision not null,
+    total_buffer_stock double precision not null,
+    min_buffer_stock double precision,
+    updated_at timestamptz not null default now(),
+    primary key ("NO_UNIT", week_start)
+);
+
+create index if not exists fuel_rollup_week_start_idx
+    on public.fuel_rollup_week (week_start, "NO_UNIT");
+
+-- Recomputes the given (unit, date, shift) keys and their weeks from the base table,
+-- each key once, in one delete and one aggregate insert per rollup table. The lookups
+-- are served by fuel_records_unit_date_shift_idx and touch at most a week of rows per key.
+drop function if exists public.refresh_fuel_rollups(text, date, text);
+
+create or replace function public.refresh_fuel_rollups(p_units text[], p_dates date[], p_shifts text[])
+returns void
+language plpgsql
+as $$
+begin
+    delete from public.fuel_rollup_shift r
+     using (select distinct unit, day, coalesce(shift, '') as shift
+              from unnest(p_units, p_dates, p_shifts) as k(unit, day, shift)) k
+     where r."NO_UNIT" = k.unit and r."Date" = k.day and r.shift = k.shift;
+    insert into public.fuel_rollup_shift
+           ("NO_UNIT", "Date", shift, record_count, total_literan, total_selisih,
+            total_buffer_stock, min_buffer_stock)
+    select k.unit, k.day, k.shift, count(*),
+           coalesce(sum(f."Literan"), 0), coalesce(sum(f."Selisih"), 0),
+           coalesce(sum(f."Buffer_Stock"), 0), min(f."Buffer_Stock")
+      from (select distinct unit, day, coalesce(shift, '') as shift
+              from unnest(p_units, p_dates, p_shifts) as k(unit, day, shift)
+             where unit is not null and day is not null) k
+      join public.fuel_records f
+        on f."NO_UNIT" = k.unit and f."Date" = k.day and coalesce(f.shift, '') = k.shift
+     group by k.unit, k.day, k.shift;
+
+    delete from public.fuel_rollup_week r
+     using (select distinct unit, date_trunc('week', day)::date as week_start
+              from unnest(p_units, p_dates) as k(unit, day)) w
+     where r."NO_UNIT" = w.unit and r.week_start = w.week_start;
+    insert into public.fuel_rollup_week
+           ("NO_UNIT", week_start, record_count, total_literan, total_selisih,
+            total_buffer_stock, min_buffer_stock)
+    select w.unit, w.week_start, count(*),
+           coalesce(sum(f."Literan"), 0), coalesce(sum(f."Selisih"), 0),
+           coalesce(sum(f."Buffer_Stock"), 0), min(f."Buffer_Stock")
+      from (select distinct unit, date_trunc('week', day)::date as week_start
+              from unnest(p_units, p_dates) as k(unit, day)
+             where unit is not null and day is not null) w
+      join public.fuel_records f
+        on f."NO_UNIT" = w.unit and f."Date" >= w.week_start and f."Date" < w.week_start + 7
+     group by w.unit, w.week_start;
+end;
+$$;
+
+-- Statement-level: a bulk insert, delete or update (reset, repair, restore, import
+-- batches) collects its distinct keys from the transition tables and refreshes each
+-- of them once, instead of running the refresh for every row it touches.
+create or replace function public.fuel_records_rollup_trigger()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_units text[];
+    v_dates date[];
+    v_shifts text[];
+begin
+    if tg_op = 'INSERT' then
+        select array_agg("NO_UNIT"), array_agg(day), array_agg(shift)
+          into v_units, v_dates, v_shifts
+          from (select distinct "NO_UNIT", "Date"::date as day, shift from new_rows) k;
+    elsif tg_op = 'DELETE' then
+        select array_agg("NO_UNIT"), array_agg(day), array_agg(shift)
+          into v_units, v_dates, v_shifts
+          from (select distinct "NO_UNIT", "Date"::date as day, shift from old_rows) k;
+    else
+        -- Only rows whose key or aggregated values changed; both their old and new keys
+        select array_agg(k.unit), array_agg(k.day), array_agg(k.shift)
+          into v_units, v_dates, v_shifts
+          from old_rows o
+          join new_rows n on n.id = o.id
+         cross join lateral (
+             values (o."NO_UNIT", o."Date"::date, o.shift), (n."NO_UNIT", n."Date"::date, n.shift)
+         ) k(unit, day, shift)
+         where (o."NO_UNIT", o."Date", o.shift, o."Literan", o."Selisih", o."Buffer_Stock")
+               is distinct from
+               (n."NO_UNIT", n."Date", n.shift, n."Literan", n."Selisih", n."Buffer_Stock");
+    end if;
+
+    if v_units is not null then
+        perform public.refresh_fuel_rollups(v_units, v_dates, v_shifts);
+    end if;
+    return null;
+end;
+$$;
+
+-- Transition tables need one trigger per event
+drop trigger if exists fuel_records_rollup on public.fuel_records;
+drop trigger if exists fuel_records_rollup_insert on public.fuel_records;
+drop trigger if exists fuel_records_rollup_update on public.fuel_records;
+drop trigger if exists fuel_records_rollup_delete on public.fuel_records;
+
+create trigger fuel_records_rollup_insert
+    after insert on public.fuel_records
+    referencing new table as new_rows
+    for each statement execute function public.fuel_records_rollup_trigger();
+
+create trigger fuel_records_rollup_update
+    after update on public.fuel_records
+    referencing old table as old_rows new table as new_rows
+    for each statement execute function public.fuel_records_rollup_trigger();
+
+create trigger fuel_records_rollup_delete
+    after delete on public.fuel_records
+    referencing old table as old_rows
+    for each statement execute function public.fuel_records_rollup_trigger();
+
+-- Backfill from the existing history
+truncate public.fuel_rollup_shift, public.fuel_rollup_week;
+
+insert into public.fuel_rollup_shift
+       ("NO_UNIT", "Date", shift, record_count, total_literan, total_selisih,
+        total_buffer_stock, min_buffer_stock)
+select "NO_UNIT", "Date"::date, coalesce(shift, ''), count(*),
+       coalesce(sum("Literan"), 0), coalesce(sum("Selisih"), 0),
+       coalesce(sum("Buffer_Stock"), 0), min("Buffer_Stock")
+  from public.fuel_records
+ where "NO_UNIT" is not null and "Date" is not null
+ group by "NO_UNIT", "Date"::date, coalesce(shift, '');
+
+insert into public.fuel_rollup_week
+       ("NO_UNIT", week_start, record_count, total_literan, total_selisih,
+        total_buffer_stock, min_buffer_stock)
+select "NO_UNIT", date_trunc('week', "Date"::date)::date, count(*),
+       coalesce(sum("Literan"), 0), coalesce(sum("Selisih"), 0),
+       coalesce(sum("Buffer_Stock"), 0), min("Buffer_Stock")
+  from public.fuel_records
+ where "NO_UNIT" is not null and "Date" is not null
+ group by "NO_UNIT", date_trunc('week', "Date"::date)::date;
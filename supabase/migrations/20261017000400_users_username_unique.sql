@@ -0,0 +1,28 @@
+-- register inserts directly and relies on this index to reject a taken username
+-- with Postgres error 23505.
+--
+-- Existing duplicate usernames would make the index fail to build. They are not
+-- renamed here, because their owners would no longer know their login name; the
+-- migration stops with the list of duplicates instead, so an admin can resolve them
+-- (rename or delete the extra accounts) and run it again.
+do $$
+declare
+    duplicates text;
+begin
+    select string_agg(format('%s (%s accounts)', username, accounts), ', ' order by username)
+      into duplicates
+      from (
+          select username, count(*) as accounts
+            from public.users
+           group by username
+          having count(*) > 1
+      ) d;
+    if duplicates is not null then
+        raise exception 'users.username has duplicates: %', duplicates
+            using hint = 'Rename or delete the extra accounts, then run this migration again.';
+    end if;
+end
+$$;
+
+create unique index if not exists users_username_key
+    on public.users (username);
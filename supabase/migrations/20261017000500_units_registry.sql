@@ -0,0 +1,43 @@
+-- Fleet registry read by the app's UnitRegistry. Units are deactivated rather than
+-- deleted so their history keeps its Penjatahan/Max_Capacity. The app polls
+-- count(*) and max(updated_at) to notice changes, so every write must bump updated_at.
+create table if not exists public.units (
+    "NO_UNIT" text primary key,
+    penjatahan integer not null check (penjatahan > 0),
+    max_capacity double precision not null check (max_capacity > 0),
+    initial_hm_awal double precision not null default 0 check (initial_hm_awal >= 0),
+    active boolean not null default true,
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists units_updated_at_idx
+    on public.units (updated_at desc);
+
+create or replace function public.units_touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists units_touch_updated_at on public.units;
+create trigger units_touch_updated_at
+    before insert or update on public.units
+    for each row execute function public.units_touch_updated_at();
+
+-- The fleet that used to be hard-coded in app/main.py
+insert into public.units ("NO_UNIT", penjatahan, max_capacity, initial_hm_awal) values
+    ('DZ3007', 52, 1000, 45645),
+    ('DZ3014', 52, 1000, 46203),
+    ('DZ3026', 52, 1200, 20629),
+    ('EX1022', 58, 980, 34750),
+    ('EX2017', 93, 1380, 46115),
+    ('EX2027', 93, 1380, 35466),
+    ('EX2032', 93, 1380, 27140),
+    ('EX2033', 93, 1380, 26280),
+    ('EX2040', 93, 1380, 19070),
+    ('EX3009', 126, 3400, 36002)
+on conflict ("NO_UNIT") do nothing;
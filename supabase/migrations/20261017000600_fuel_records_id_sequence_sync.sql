@@ -0,0 +1,13 @@
+-- Called by the restore-backup command: restored rows keep their original ids, so the
+-- id sequence is moved past the highest id to keep later inserts from colliding.
+create or replace function public.sync_fuel_records_id_sequence()
+returns bigint
+language sql
+security definer
+set search_path = public
+as $$
+    select setval(
+        pg_get_serial_sequence('public.fuel_records', 'id'),
+        greatest(coalesce((select max(id) from public.fuel_records), 0), 1)
+    );
+$$;
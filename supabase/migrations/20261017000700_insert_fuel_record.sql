@@ -0,0 +1,55 @@
+-- Called by add_new_record: reads the unit's latest HM_Akhir, validates the new
+-- HM_Akhir against it and inserts the row in one transaction. The advisory lock is
+-- keyed by unit, so concurrent entries for the same unit queue up behind each other
+-- while entries for other units proceed in parallel.
+create or replace function public.insert_fuel_record(p_record jsonb, p_initial_hm_awal double precision default 0)
+returns public.fuel_records
+language plpgsql
+as $$
+declare
+    v_unit text := p_record->>'NO_UNIT';
+    v_hm_akhir double precision := round((p_record->>'HM_Akhir')::numeric, 2);
+    v_penjatahan double precision := (p_record->>'Penjatahan')::double precision;
+    v_max_capacity double precision := (p_record->>'Max_Capacity')::double precision;
+    v_hm_awal double precision;
+    v_selisih double precision;
+    v_row public.fuel_records;
+begin
+    perform pg_advisory_xact_lock(hashtextextended('fuel_records:' || v_unit, 0));
+
+    -- Same ordering as get_latest_record in the app
+    select "HM_Akhir" into v_hm_awal
+      from public.fuel_records
+     where "NO_UNIT" = v_unit
+     order by "Date" desc, shift desc, id desc
+     limit 1;
+    v_hm_awal := round(coalesce(v_hm_awal, p_initial_hm_awal)::numeric, 2);
+
+    if v_hm_akhir <= v_hm_awal then
+        raise exception 'HM_AKHIR_NOT_INCREASING'
+            using hint = v_hm_awal::text,
+                  detail = format('HM_Akhir %s is not greater than the latest HM_Akhir %s of %s',
+                                  v_hm_akhir, v_hm_awal, v_unit);
+    end if;
+
+    v_selisih := round((v_hm_akhir - v_hm_awal)::numeric, 2);
+
+    -- jsonb_populate_record casts every value to the table's own column types
+    insert into public.fuel_records
+           ("Date", "NO_UNIT", "HM_Awal", "HM_Akhir", "Selisih", "Literan", "Penjatahan",
+            "Max_Capacity", "Buffer_Stock", is_new, shift)
+    select r."Date", r."NO_UNIT", r."HM_Awal", r."HM_Akhir", r."Selisih", r."Literan", r."Penjatahan",
+           r."Max_Capacity", r."Buffer_Stock", r.is_new, r.shift
+      from jsonb_populate_record(null::public.fuel_records, p_record || jsonb_build_object(
+               'HM_Awal', v_hm_awal,
+               'HM_Akhir', v_hm_akhir,
+               'Selisih', v_selisih,
+               'Literan', round((v_selisih * v_penjatahan)::numeric, 2),
+               'Buffer_Stock', round((v_max_capacity - v_selisih * v_penjatahan)::numeric, 2),
+               'is_new', true
+           )) r
+    returning * into v_row;
+
+    return v_row;
+end;
+$$;
@@ -0,0 +1,6 @@
+-- Supports the keyset-paged exports in iter_record_chunks:
+--   select ... where ("Date", shift, id) come after the previous page's last row
+--   order by "Date", shift, id limit $1
+-- Single-unit exports use fuel_records_unit_date_shift_idx, scanned backwards.
+create index if not exists fuel_records_date_shift_id_idx
+    on public.fuel_records ("Date", shift, id);
@@ -0,0 +1,91 @@
+-- Version counters read by DataVersion for ETags, Last-Modified and the record mirror.
+-- Statement triggers bump a counter row per unit touched by every insert, update and
+-- delete (and every row on truncate), so checking for changes reads this small table
+-- instead of counting fuel_records. The app sums the rows:
+--   version     changes with every write statement
+--   generation  changes when existing rows are updated or removed (reset, repair,
+--               restore), which tells the mirror to rebuild instead of appending
+--
+-- One row per unit rather than one per table: the row lock a writer holds until
+-- commit then only queues writers of the same unit, which insert_fuel_record's
+-- advisory lock serializes anyway, and entries for different units stay parallel.
+-- The counters are transactional (unlike a sequence), so a reader never sees a new
+-- version before the rows it stands for are visible.
+create table if not exists public.data_versions (
+    name text not null,
+    unit text not null default '',
+    version bigint not null default 0,
+    generation bigint not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (name, unit)
+);
+
+-- The table-wide row keeps the fingerprint readable before the first write
+insert into public.data_versions (name) values ('fuel_records')
+on conflict (name, unit) do nothing;
+
+create or replace function public.bump_fuel_records_version()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_units text[];
+begin
+    if tg_op = 'TRUNCATE' then
+        update public.data_versions
+           set version = version + 1,
+               generation = generation + 1,
+               updated_at = now()
+         where name = tg_table_name;
+        return null;
+    end if;
+
+    -- A transition table can only be named in the triggers that define it
+    if tg_op = 'INSERT' then
+        select array_agg(distinct coalesce("NO_UNIT", '')) into v_units from new_rows;
+    elsif tg_op = 'DELETE' then
+        select array_agg(distinct coalesce("NO_UNIT", '')) into v_units from old_rows;
+    else
+        select array_agg(distinct coalesce(u."NO_UNIT", '')) into v_units
+          from (select "NO_UNIT" from old_rows union all select "NO_UNIT" from new_rows) u;
+    end if;
+
+    -- Units in sorted order, so two multi-unit statements lock their rows in the same order
+    insert into public.data_versions as d (name, unit, version, generation)
+    select tg_table_name, t.unit, 1, case when tg_op = 'INSERT' then 0 else 1 end
+      from unnest(v_units) as t(unit)
+     order by t.unit
+    on conflict (name, unit) do update
+       set version = d.version + 1,
+           generation = d.generation + excluded.generation,
+           updated_at = now();
+    return null;
+end;
+$$;
+
+drop trigger if exists fuel_records_data_version on public.fuel_records;
+drop function if exists public.bump_data_version();
+
+-- Transition tables allow only one event per trigger
+drop trigger if exists fuel_records_data_version_insert on public.fuel_records;
+create trigger fuel_records_data_version_insert
+    after insert on public.fuel_records
+    referencing new table as new_rows
+    for each statement execute function public.bump_fuel_records_version();
+
+drop trigger if exists fuel_records_data_version_update on public.fuel_records;
+create trigger fuel_records_data_version_update
+    after update on public.fuel_records
+    referencing old table as old_rows new table as new_rows
+    for each statement execute function public.bump_fuel_records_version();
+
+drop trigger if exists fuel_records_data_version_delete on public.fuel_records;
+create trigger fuel_records_data_version_delete
+    after delete on public.fuel_records
+    referencing old table as old_rows
+    for each statement execute function public.bump_fuel_records_version();
+
+drop trigger if exists fuel_records_data_version_truncate on public.fuel_records;
+create trigger fuel_records_data_version_truncate
+    after truncate on public.fuel_records
+    for each statement execute function public.bump_fuel_records_version();
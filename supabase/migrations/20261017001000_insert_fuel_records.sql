@@ -0,0 +1,87 @@
+-- Called by the bulk import: the set-based counterpart of insert_fuel_record. Takes
+-- the same per-unit advisory locks (in unit order, so two imports cannot deadlock)
+-- and chains every unit's rows onto its latest stored row inside one transaction, so
+-- an /add_record entry for the same unit can no longer slip in between the import's
+-- read of the latest HM_Akhir and its insert.
+--
+-- p_records holds the rows in the order they should be inserted, with Penjatahan and
+-- Max_Capacity already set; HM_Awal, Selisih, Literan and Buffer_Stock are recomputed
+-- here. A row whose (Date, shift) is not after the unit's latest row, or whose
+-- HM_Akhir does not increase, is skipped. Returns the inserted rows; the app reports
+-- the skipped ones as rejected.
+create or replace function public.insert_fuel_records(p_records jsonb, p_initial_hm_awal jsonb default '{}'::jsonb)
+returns setof public.fuel_records
+language plpgsql
+as $$
+declare
+    v_unit text;
+    v_item record;
+    v_new public.fuel_records;
+    v_latest_date public.fuel_records."Date"%type;
+    v_latest_shift public.fuel_records.shift%type;
+    v_hm_awal double precision;
+    v_hm_akhir double precision;
+    v_selisih double precision;
+    v_rows jsonb := '[]'::jsonb;
+begin
+    for v_unit in
+        select distinct r->>'NO_UNIT' from jsonb_array_elements(p_records) r order by 1
+    loop
+        perform pg_advisory_xact_lock(hashtextextended('fuel_records:' || v_unit, 0));
+
+        -- Same ordering as get_latest_record in the app
+        v_latest_date := null;
+        v_latest_shift := null;
+        v_hm_awal := null;
+        select "Date", shift, "HM_Akhir" into v_latest_date, v_latest_shift, v_hm_awal
+          from public.fuel_records
+         where "NO_UNIT" = v_unit
+         order by "Date" desc, shift desc, id desc
+         limit 1;
+        v_hm_awal := round(coalesce(v_hm_awal, (p_initial_hm_awal->>v_unit)::double precision, 0)::numeric, 2);
+
+        for v_item in
+            select e.r, e.n
+              from jsonb_array_elements(p_records) with ordinality as e(r, n)
+             where e.r->>'NO_UNIT' = v_unit
+             order by e.n
+        loop
+            v_new := jsonb_populate_record(null::public.fuel_records, v_item.r);
+            v_hm_akhir := round(v_new."HM_Akhir"::numeric, 2);
+            if v_hm_akhir <= v_hm_awal
+               or (v_latest_date is not null and (v_new."Date", v_new.shift) <= (v_latest_date, v_latest_shift)) then
+                continue;
+            end if;
+
+            v_selisih := round((v_hm_akhir - v_hm_awal)::numeric, 2);
+            v_rows := v_rows || jsonb_build_array(v_item.r || jsonb_build_object(
+                '_n', v_item.n,
+                'HM_Awal', v_hm_awal,
+                'HM_Akhir', v_hm_akhir,
+                'Selisih', v_selisih,
+                'Literan', round((v_selisih * v_new."Penjatahan")::numeric, 2),
+                'Buffer_Stock', round((v_new."Max_Capacity" - v_selisih * v_new."Penjatahan")::numeric, 2),
+                'is_new', true
+            ));
+            v_hm_awal := v_hm_akhir;
+            v_latest_date := v_new."Date";
+            v_latest_shift := v_new.shift;
+        end loop;
+    end loop;
+
+    -- One insert for the whole batch, in the caller's order so ids follow the chain
+    return query
+    with inserted as (
+        insert into public.fuel_records
+               ("Date", "NO_UNIT", "HM_Awal", "HM_Akhir", "Selisih", "Literan", "Penjatahan",
+                "Max_Capacity", "Buffer_Stock", is_new, shift)
+        select r."Date", r."NO_UNIT", r."HM_Awal", r."HM_Akhir", r."Selisih", r."Literan", r."Penjatahan",
+               r."Max_Capacity", r."Buffer_Stock", r.is_new, r.shift
+          from jsonb_array_elements(v_rows) as e(item)
+         cross join lateral jsonb_populate_record(null::public.fuel_records, e.item) r
+         order by (e.item->>'_n')::bigint
+        returning *
+    )
+    select * from inserted;
+end;
+$$;